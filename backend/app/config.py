@@ -18,16 +18,32 @@ class Settings(BaseSettings):
     db_name: str = Field(default="fin_ai_world_model_v2", env="DB_NAME")
     db_host: str = Field(default="localhost", env="DB_HOST")
     db_port: int = Field(default=5432, env="DB_PORT")
+    db_pool_min_size: int = Field(default=1, env="DB_POOL_MIN_SIZE")
+    db_pool_max_size: int = Field(default=8, env="DB_POOL_MAX_SIZE")
     
     # App Config
     api_prefix: str = Field(default="/api", env="API_PREFIX")
     output_dir: str = Field(default="./outputs", env="OUTPUT_DIR")
+    # Worker processes running training/backtest jobs concurrently
+    job_workers: int = Field(default=1, env="JOB_WORKERS")
     
     # Training defaults
     train_test_split: float = 0.8
     initial_amount: float = 1e6
     max_stock: int = 100
     transaction_cost_pct: float = 0.001
+    # Approximate tanh in the env state; keep fixed for models already trained
+    env_fast_tanh: bool = False
+    # Env copies stepped together for PPO/A2C rollouts
+    train_num_envs: int = 1
+    # Torch intra-op threads for CPU training and backtests (0 keeps torch's default)
+    torch_num_threads: int = 1
+    # torch.compile the policy while training; adds compile time up front
+    train_torch_compile: bool = False
+    # Algorithms of one job trained at the same time, each in its own process
+    train_parallel_algorithms: int = 1
+    # Models/strategies of one backtest run at the same time, each in its own process
+    backtest_parallel_workers: int = 1
     
     class Config:
         env_file = ".env"
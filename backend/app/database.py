@@ -1,9 +1,17 @@
 """Database connection and SSH tunnel management"""
+import asyncio
+import io
+import asyncpg
 import psycopg2
+import pandas as pd
+from psycopg2.extensions import encodings as pg_encodings
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 from sshtunnel import SSHTunnelForwarder
 from typing import Optional, List, Dict, Any
 import logging
+import threading
+import time
 from contextlib import contextmanager
 
 from .config import settings
@@ -17,30 +25,98 @@ class DatabaseManager:
     def __init__(self):
         self.tunnel: Optional[SSHTunnelForwarder] = None
         self.local_port: Optional[int] = None
+        self.pool: Optional[ThreadedConnectionPool] = None
+        # ThreadedConnectionPool raises instead of waiting when all of its
+        # connections are in use, so callers first take one of these slots
+        self._pool_slots = threading.BoundedSemaphore(settings.db_pool_max_size)
+        # Guards pool replacement and the per-pool checked-out counts; a
+        # replaced pool is closed only once its last connection is returned
+        self._pool_lock = threading.Lock()
+        self._checked_out: Dict[ThreadedConnectionPool, int] = {}
+        # Serializes tunnel (re)starts from concurrent threads
+        self._tunnel_lock = threading.Lock()
+        # asyncpg pool for async request handlers, and the tunnel port it uses
+        self.async_pool: Optional[asyncpg.Pool] = None
+        self._async_pool_port: Optional[int] = None
+        # Serializes creating and closing the asyncpg pool across requests
+        self._async_pool_lock = asyncio.Lock()
+        # Ticker -> stock row; the ticker/id mapping is assumed not to change
+        # while the process is running
+        self._symbol_cache: Dict[str, Dict[str, Any]] = {}
+        # time.monotonic() of the last query that succeeded, for cheap health checks
+        self.last_ok: float = 0.0
         
     def start_tunnel(self):
         """Start SSH tunnel"""
+        with self._tunnel_lock:
+            self._start_tunnel()
+    
+    def _start_tunnel(self):
         if self.tunnel and self.tunnel.is_active:
-            logger.info("SSH tunnel already active")
-            return
-            
+            if self.pool is not None:
+                logger.info("SSH tunnel already active")
+                return
+            # The tunnel is up but no pool was built on it; build one below
+            started = False
+        else:
+            try:
+                self.tunnel = SSHTunnelForwarder(
+                    (settings.ssh_host, settings.ssh_port),
+                    ssh_username=settings.ssh_user,
+                    ssh_password=settings.ssh_password,
+                    remote_bind_address=(settings.db_host, settings.db_port),
+                    local_bind_address=('127.0.0.1', 0)  # Use random available port
+                )
+                self.tunnel.start()
+                self.local_port = self.tunnel.local_bind_port
+                logger.info(f"SSH tunnel started on local port {self.local_port}")
+            except Exception as e:
+                logger.error(f"Failed to start SSH tunnel: {e}")
+                raise
+            started = True
+            # Connections of the previous pool went through the old tunnel
+            self._close_pool()
+        
         try:
-            self.tunnel = SSHTunnelForwarder(
-                (settings.ssh_host, settings.ssh_port),
-                ssh_username=settings.ssh_user,
-                ssh_password=settings.ssh_password,
-                remote_bind_address=(settings.db_host, settings.db_port),
-                local_bind_address=('127.0.0.1', 0)  # Use random available port
+            pool = ThreadedConnectionPool(
+                settings.db_pool_min_size,
+                settings.db_pool_max_size,
+                host='127.0.0.1',
+                port=self.local_port,
+                database=settings.db_name,
+                user=settings.db_user,
+                password=settings.db_password,
+                cursor_factory=RealDictCursor
             )
-            self.tunnel.start()
-            self.local_port = self.tunnel.local_bind_port
-            logger.info(f"SSH tunnel started on local port {self.local_port}")
         except Exception as e:
-            logger.error(f"Failed to start SSH tunnel: {e}")
+            logger.error(f"Failed to create database connection pool: {e}")
+            if started:
+                # Start over on the next call instead of keeping a tunnel
+                # without a pool
+                self.tunnel.stop()
+                self.tunnel = None
+                self.local_port = None
             raise
+        self._close_pool(replacement=pool)
+        logger.info(f"Database connection pool created (max {settings.db_pool_max_size} connections)")
+    
+    def _close_pool(self, replacement: Optional[ThreadedConnectionPool] = None):
+        """
+        Swap in ``replacement`` for the current pool and close the old one
+        
+        If other threads still hold connections of the old pool, closing is
+        left to the thread returning the last of them.
+        """
+        with self._pool_lock:
+            old, self.pool = self.pool, replacement
+            if old is not None and not self._checked_out.get(old):
+                self._checked_out.pop(old, None)
+                if not old.closed:
+                    old.closeall()
     
     def stop_tunnel(self):
         """Stop SSH tunnel"""
+        self._close_pool()
         if self.tunnel and self.tunnel.is_active:
             self.tunnel.stop()
             logger.info("SSH tunnel stopped")
@@ -49,27 +125,115 @@ class DatabaseManager:
     
     @contextmanager
     def get_connection(self):
-        """Get database connection as context manager"""
-        if not self.tunnel or not self.tunnel.is_active:
+        """Get a pooled database connection as context manager"""
+        if not self.tunnel or not self.tunnel.is_active or self.pool is None:
             self.start_tunnel()
         
+        # Wait for a free connection rather than fail with PoolError
+        self._pool_slots.acquire()
+        with self._pool_lock:
+            pool = self.pool
+            if pool is not None:
+                self._checked_out[pool] = self._checked_out.get(pool, 0) + 1
+        if pool is None:
+            # Stopped by another thread since the check above
+            self._pool_slots.release()
+            raise RuntimeError("Database connection pool is closed")
         conn = None
         try:
-            conn = psycopg2.connect(
-                host='127.0.0.1',
-                port=self.local_port,
-                database=settings.db_name,
-                user=settings.db_user,
-                password=settings.db_password,
-                cursor_factory=RealDictCursor
-            )
+            conn = pool.getconn()
             yield conn
         except Exception as e:
             logger.error(f"Database connection error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            try:
+                if conn:
+                    # End the implicit transaction so the connection is returned idle;
+                    # broken connections are discarded instead of reused
+                    if not conn.closed:
+                        try:
+                            conn.rollback()
+                        except psycopg2.Error:
+                            pass
+                    pool.putconn(conn, close=bool(conn.closed))
+            finally:
+                self._release_pool(pool)
+                self._pool_slots.release()
+    
+    def _release_pool(self, pool: ThreadedConnectionPool):
+        """Drop a checkout of ``pool``, closing it if it was replaced and is now unused"""
+        with self._pool_lock:
+            remaining = self._checked_out[pool] - 1
+            if remaining:
+                self._checked_out[pool] = remaining
+                return
+            del self._checked_out[pool]
+            if pool is not self.pool and not pool.closed:
+                pool.closeall()
+    
+    async def open_async_pool(self):
+        """Create the asyncpg pool used by async request handlers"""
+        async with self._async_pool_lock:
+            await self._open_async_pool()
+    
+    async def _open_async_pool(self):
+        if not self.tunnel or not self.tunnel.is_active:
+            # The SSH handshake blocks; keep it off the event loop
+            await asyncio.to_thread(self.start_tunnel)
+        await self._close_async_pool()
+        self.async_pool = await asyncpg.create_pool(
+            host='127.0.0.1',
+            port=self.local_port,
+            database=settings.db_name,
+            user=settings.db_user,
+            password=settings.db_password,
+            min_size=settings.db_pool_min_size,
+            max_size=settings.db_pool_max_size,
+            command_timeout=60
+        )
+        self._async_pool_port = self.local_port
+        logger.info(f"Async database pool created (max {settings.db_pool_max_size} connections)")
+    
+    async def close_async_pool(self):
+        """Close the asyncpg pool"""
+        async with self._async_pool_lock:
+            await self._close_async_pool()
+    
+    async def _close_async_pool(self):
+        if self.async_pool is not None:
+            await self.async_pool.close()
+        self.async_pool = None
+        self._async_pool_port = None
+    
+    def _async_pool_stale(self) -> bool:
+        return (self.async_pool is None or not self.tunnel or not self.tunnel.is_active
+                or self._async_pool_port != self.local_port)
+    
+    async def _get_async_pool(self) -> asyncpg.Pool:
+        """Get the asyncpg pool, recreating it if the SSH tunnel was restarted"""
+        if self._async_pool_stale():
+            async with self._async_pool_lock:
+                # Another request may have recreated it while this one waited
+                if self._async_pool_stale():
+                    await self._open_async_pool()
+        return self.async_pool
+    
+    async def fetch(self, query: str, *args) -> List[Dict[str, Any]]:
+        """Execute a SELECT query ($1-style parameters) without blocking the event loop"""
+        pool = await self._get_async_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(query, *args)
+        self.last_ok = time.monotonic()
+        return [dict(row) for row in rows]
+    
+    async def fetchval(self, query: str, *args) -> Any:
+        """Execute a query and return the first column of the first row"""
+        pool = await self._get_async_pool()
+        async with pool.acquire() as conn:
+            value = await conn.fetchval(query, *args)
+        self.last_ok = time.monotonic()
+        return value
     
     def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
         """Execute a SELECT query and return results"""
@@ -77,21 +241,40 @@ class DatabaseManager:
             with conn.cursor() as cursor:
                 cursor.execute(query, params)
                 results = cursor.fetchall()
-                return [dict(row) for row in results]
+        self.last_ok = time.monotonic()
+        return [dict(row) for row in results]
     
     def get_stock_by_symbol(self, symbol: str) -> Optional[Dict[str, Any]]:
         """Get stock information by ticker symbol"""
+        if symbol in self._symbol_cache:
+            return dict(self._symbol_cache[symbol])
         query = "SELECT id, ticker as symbol, name FROM kol.stock WHERE ticker = %s LIMIT 1"
         results = self.execute_query(query, (symbol,))
-        return results[0] if results else None
+        if not results:
+            return None
+        self._symbol_cache[symbol] = results[0]
+        return dict(results[0])
     
     def get_stocks_by_symbols(self, symbols: List[str]) -> List[Dict[str, Any]]:
-        """Get multiple stocks by ticker symbols"""
+        """Get multiple stocks by ticker symbols, in the order requested"""
         if not symbols:
             return []
-        placeholders = ','.join(['%s'] * len(symbols))
-        query = f"SELECT id, ticker as symbol, name FROM kol.stock WHERE ticker IN ({placeholders})"
-        return self.execute_query(query, tuple(symbols))
+        symbols = list(dict.fromkeys(symbols))
+        missing = [symbol for symbol in symbols if symbol not in self._symbol_cache]
+        if missing:
+            placeholders = ','.join(['%s'] * len(missing))
+            query = f"SELECT id, ticker as symbol, name FROM kol.stock WHERE ticker IN ({placeholders})"
+            for stock in self.execute_query(query, tuple(missing)):
+                self._symbol_cache[stock['symbol']] = stock
+        return [
+            dict(self._symbol_cache[symbol])
+            for symbol in symbols
+            if symbol in self._symbol_cache
+        ]
+    
+    def clear_symbol_cache(self):
+        """Forget cached ticker lookups"""
+        self._symbol_cache.clear()
     
     def get_stock_prices(
         self, 
@@ -135,6 +318,55 @@ class DatabaseManager:
         params = tuple(stock_ids) + (start_date, end_date)
         return self.execute_query(query, params)
     
+    def get_multiple_stock_prices_df(
+        self,
+        stock_ids: List[int],
+        start_date: str,
+        end_date: str
+    ) -> pd.DataFrame:
+        """
+        Get stock prices for multiple stocks within date range as a DataFrame
+        
+        Streams the rows with COPY ... TO STDOUT so no per-row Python objects
+        are built; columns are stock_id, date, open, high, low, close, volume.
+        """
+        columns = ['stock_id', 'date', 'open', 'high', 'low', 'close', 'volume']
+        if not stock_ids:
+            return pd.DataFrame(columns=columns)
+        placeholders = ','.join(['%s'] * len(stock_ids))
+        query = f"""
+            SELECT stock_id, date,
+                   open_price as open, high_price as high,
+                   low_price as low, close_price as close, volume
+            FROM kol.stock_price 
+            WHERE stock_id IN ({placeholders})
+            AND date >= %s 
+            AND date <= %s
+            ORDER BY date ASC, stock_id ASC
+        """
+        params = tuple(stock_ids) + (start_date, end_date)
+        
+        buf = io.StringIO()
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                # COPY does not take bind parameters, so inline them safely first
+                select_sql = cursor.mogrify(query, params).decode(pg_encodings[conn.encoding])
+                cursor.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH (FORMAT CSV, HEADER)", buf)
+        buf.seek(0)
+        
+        return pd.read_csv(
+            buf,
+            parse_dates=['date'],
+            dtype={
+                'stock_id': 'int64',
+                'open': 'float64',
+                'high': 'float64',
+                'low': 'float64',
+                'close': 'float64',
+                'volume': 'float64'
+            }
+        )
+    
     def inspect_schema(self) -> Dict[str, Any]:
         """Inspect database schema for stock and stock_price tables"""
         stock_schema = self.execute_query("""
@@ -0,0 +1,153 @@
+"""Numba-compiled kernels for backtest and evaluation bookkeeping"""
+import math
+import numpy as np
+from numba import njit, types
+
+from .env_kernels import INVESTABLE_FRACTION, execute_trades, target_values_into
+
+_VEC64 = types.Array(types.float64, 1, 'C')
+_MAT64 = types.Array(types.float64, 2, 'C')
+_TABLE = types.Array(types.float32, 2, 'C', readonly=True)
+
+
+@njit(types.void(_VEC64, types.float64, _VEC64, _VEC64), cache=True)
+def step_returns(portfolio_values, initial_value, returns, cumulative_returns):
+    """
+    Daily and cumulative percentage returns of a backtest episode in one pass
+
+    Args:
+        portfolio_values: Shape (steps + 1,) - portfolio value before the first
+            step followed by the value after each step
+        initial_value: Value the cumulative return is measured from
+        returns: Shape (steps,) - filled with the step-over-step change, in %
+        cumulative_returns: Shape (steps,) - filled with the change since
+            ``initial_value``, in %
+    """
+    for t in range(returns.shape[0]):
+        prev = portfolio_values[t]
+        current = portfolio_values[t + 1]
+        returns[t] = ((current - prev) / prev) * 100
+        cumulative_returns[t] = ((current - initial_value) / initial_value) * 100
+
+
+@njit(types.UniTuple(types.float64, 5)(_VEC64), cache=True)
+def episode_metrics(returns):
+    """
+    Performance metrics of a daily return series (in %) in one fused pass
+
+    Compounded growth, drawdown, mean/variance (Welford's update, population
+    variance as np.std) and the win count are accumulated together, so no
+    intermediate arrays are built.
+
+    Args:
+        returns: Shape (steps,) - daily returns in %
+
+    Returns:
+        (total return, Sharpe ratio, max drawdown in %, volatility, win rate)
+    """
+    n = returns.shape[0]
+    if n == 0:
+        return 0.0, 0.0, 0.0, 0.0, 0.0
+
+    growth = 1.0
+    running_max = -math.inf
+    min_drawdown = math.inf
+    mean = 0.0
+    m2 = 0.0
+    wins = 0
+    for t in range(n):
+        r = returns[t]
+        growth *= 1 + r / 100
+        running_max = max(running_max, growth)
+        min_drawdown = min(min_drawdown, (growth - running_max) / running_max)
+
+        delta = r - mean
+        mean += delta / (t + 1)
+        m2 += delta * (r - mean)
+
+        if r > 0:
+            wins += 1
+
+    std = math.sqrt(m2 / n)
+    # Sharpe ratio assumes 252 trading days and a 0% risk-free rate
+    sharpe_ratio = (mean / (std + 1e-9)) * math.sqrt(252)
+    return growth - 1, sharpe_ratio, min_drawdown * 100, std / 100, wins / n
+
+
+@njit(types.UniTuple(types.float64, 3)(_MAT64), cache=True)
+def pooled_episode_metrics(portfolio_values):
+    """
+    Sharpe ratio, max drawdown and win rate of several episodes in one pass
+
+    The daily returns of all episodes are pooled, episode after episode, as
+    one series for the Sharpe ratio (Welford's update, population variance as
+    np.std) and the win rate. The drawdown is tracked per episode against
+    that episode's running peak, and the deepest one is reported.
+
+    Args:
+        portfolio_values: Shape (steps + 1, episodes) - portfolio value after
+            reset followed by the value after each step, per episode
+
+    Returns:
+        (Sharpe ratio, max drawdown as a negative fraction, win rate)
+    """
+    steps = portfolio_values.shape[0] - 1
+    episodes = portfolio_values.shape[1]
+    if steps <= 0 or episodes == 0:
+        return 0.0, 0.0, 0.0
+
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    wins = 0
+    max_drawdown = 0.0
+    for e in range(episodes):
+        peak = portfolio_values[0, e]
+        for t in range(1, steps + 1):
+            prev = portfolio_values[t - 1, e]
+            current = portfolio_values[t, e]
+            r = (current - prev) / prev
+
+            count += 1
+            delta = r - mean
+            mean += delta / count
+            m2 += delta * (r - mean)
+            if r > 0:
+                wins += 1
+
+            peak = max(peak, current)
+            max_drawdown = min(max_drawdown, current / peak - 1)
+
+    std = math.sqrt(m2 / count)
+    # Sharpe ratio assumes 252 trading days and a 0% risk-free rate
+    sharpe_ratio = (mean / (std + 1e-9)) * math.sqrt(252)
+    return sharpe_ratio, max_drawdown, wins / count
+
+
+@njit(types.void(_TABLE, _VEC64, types.float64, types.float64, _VEC64), cache=True)
+def fixed_action_values(close, action, initial_amount, cost_pct, portfolio_values):
+    """
+    Portfolio values of an episode that repeats one action every day
+
+    Replays CustomStockTradingEnv.step (softmax target positions, then the same
+    trade kernel) without building observations, for strategies that ignore
+    the state. The env's deterministic reset is assumed: all cash, no shares.
+
+    Args:
+        close: Shape (steps + 1, N) - the env's closing prices
+        action: Shape (N,) - action taken at every step
+        initial_amount: Initial cash
+        cost_pct: Transaction cost percentage
+        portfolio_values: Shape (steps + 1,) - filled with the value after
+            reset followed by the value after each step
+    """
+    shares = np.zeros(close.shape[1], dtype=np.float32)
+    target_values = np.empty(close.shape[1])
+    amount = initial_amount
+    total_asset = initial_amount
+    portfolio_values[0] = total_asset
+    for t in range(1, close.shape[0]):
+        target_values_into(action, total_asset * INVESTABLE_FRACTION, target_values)
+        amount, stock_value = execute_trades(close[t], shares, target_values, amount, cost_pct)
+        total_asset = stock_value + amount
+        portfolio_values[t] = total_asset
@@ -0,0 +1,191 @@
+"""Batched Stock Trading Environment running K portfolios in one VecEnv"""
+import numpy as np
+from typing import Any, List, Optional, Sequence, Type
+import logging
+import gymnasium as gym
+from stable_baselines3.common.vec_env import VecEnv
+
+from .env_kernels import (
+    INVESTABLE_FRACTION, build_state_batch, execute_trades_batch, target_values_batch
+)
+from .stock_env import CustomStockTradingEnv, ARY
+
+logger = logging.getLogger(__name__)
+
+# CustomStockTradingEnv attributes and methods that hold or touch one
+# portfolio's state; the batch keeps that state in its own arrays, so the
+# shared env's copies are never used
+_PORTFOLIO_ATTRS = frozenset({
+    "day", "amount", "shares", "total_asset", "cumulative_returns", "_reward_sum", "_reward_count"
+})
+_PORTFOLIO_METHODS = frozenset({"reset", "step", "get_state", "get_total_asset"})
+
+
+class BatchStockTradingEnv(VecEnv):
+    """
+    K copies of CustomStockTradingEnv stepped together as one Stable-Baselines3 VecEnv
+
+    All copies trade the same price series. Resets are deterministic and every
+    episode has the same length, so the copies always stay on the same day and
+    only their portfolios differ. Holdings, cash and asset values are stored as
+    (K, N) / (K,) arrays, and state building and trade execution for all K
+    portfolios are one compiled kernel call each. The Python and NumPy overhead
+    is paid once per step instead of K times, as it would be with DummyVecEnv.
+
+    Per-portfolio semantics (softmax target weights, sequential trades, rewards,
+    terminal bonus) are identical to CustomStockTradingEnv. Finished episodes
+    are reset automatically. The final state is reported as
+    ``terminal_observation`` in the info dicts, like the SB3 VecEnvs do, and the
+    final portfolio value as ``total_asset``.
+    """
+
+    def __init__(self, env: CustomStockTradingEnv, num_envs: int):
+        """
+        Initialize batched trading environment
+
+        Args:
+            env: Environment whose market data, parameters and spaces are used;
+                its read-only arrays are shared, not copied
+            num_envs: Number of parallel portfolios (K)
+        """
+        if env.max_step < 1:
+            raise ValueError("BatchStockTradingEnv needs price data for at least one trading step")
+        self.env = env
+        super().__init__(num_envs, self.env.observation_space, self.env.action_space)
+
+        k, n = num_envs, self.env.shares_num
+        self.day = 0
+        self.amount = np.zeros(k)
+        self.shares = np.zeros((k, n), dtype=np.float32)
+        self.total_asset = np.zeros(k)
+        self._stock_value = np.zeros(k)
+        self._target_values = np.zeros((k, n))
+        self._reward_sum = np.zeros(k)
+        self._reward_count = 0
+        self._actions: Optional[ARY] = None
+
+        # Double-buffered like CustomStockTradingEnv.get_state: off-policy
+        # algorithms keep the previous observation batch for one more step
+        self._state_bufs = np.empty((2, k, self.env.state_dim), dtype=np.float32)
+        self._state_buf_idx = 0
+
+        logger.info(f"Batch environment initialized with {k} portfolios")
+
+    def reset(self) -> ARY:
+        """Reset all portfolios to the initial state"""
+        self.day = 0
+        self.amount[:] = self.env.initial_amount
+        self.shares[:] = 0
+        self.total_asset[:] = self.env.initial_amount
+        self._reward_sum[:] = 0
+        self._reward_count = 0
+        return self._get_state()
+
+    def _get_state(self) -> ARY:
+        """Build the (K, state_dim) state batch for the current day"""
+        self._state_buf_idx ^= 1
+        state = self._state_bufs[self._state_buf_idx]
+        env = self.env
+        build_state_batch(
+            env.close_ary[self.day],
+            env._market_features[self.day],
+            self.shares,
+            self.amount,
+            self.total_asset,
+            env.initial_amount,
+            env.fast_tanh,
+            state
+        )
+        return state
+
+    def step_async(self, actions: ARY) -> None:
+        self._actions = actions
+
+    def step_wait(self):
+        """Step all portfolios one day; see CustomStockTradingEnv.step"""
+        env = self.env
+        actions = np.asarray(self._actions).reshape(self.num_envs, env.action_dim)
+        self.day += 1
+        current_prices = env.close_ary[self.day]
+        investable_amount = self.total_asset * INVESTABLE_FRACTION  # Reserve 5% cash buffer
+
+        # Softmax over each portfolio's actions gives its target weights
+        target_values_batch(actions, investable_amount, self._target_values)
+
+        execute_trades_batch(
+            current_prices, self.shares, self._target_values, self.amount,
+            env.cost_pct, self._stock_value
+        )
+
+        total_asset = self._stock_value + self.amount
+        rewards = (total_asset - self.total_asset) * env.reward_scale
+        self._reward_sum += rewards
+        self._reward_count += 1
+        self.total_asset[:] = total_asset
+
+        state = self._get_state()
+        infos: List[dict] = [{} for _ in range(self.num_envs)]
+        terminal = self.day >= env.max_step
+        if terminal:
+            rewards += env._terminal_coef * (self._reward_sum / self._reward_count)
+            terminal_state = state.copy()
+            for i, info in enumerate(infos):
+                info["terminal_observation"] = terminal_state[i]
+                info["total_asset"] = float(total_asset[i])
+                info["TimeLimit.truncated"] = False
+            state = self.reset()
+
+        dones = np.full(self.num_envs, terminal)
+        return state, rewards.astype(np.float32), dones, infos
+
+    def get_total_asset(self) -> ARY:
+        """Get current total asset value of every portfolio"""
+        return self.total_asset.copy()
+
+    def close(self) -> None:
+        self.env.close()
+
+    def _indices(self, indices) -> Sequence[int]:
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+    def _covers_all(self, indices) -> bool:
+        return set(self._indices(indices)) == set(range(self.num_envs))
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        indices = self._indices(indices)
+        if attr_name in _PORTFOLIO_ATTRS:
+            if not hasattr(self, attr_name):
+                raise NotImplementedError(f"BatchStockTradingEnv does not track {attr_name!r}")
+            value = getattr(self, attr_name)
+            if isinstance(value, np.ndarray):
+                return [value[i] for i in indices]
+            # Day and step count are shared by all portfolios
+            return [value] * len(indices)
+        # Static configuration is shared by all portfolios
+        return [getattr(self.env, attr_name)] * len(indices)
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        # Configuration lives on the shared env, so it can only change for
+        # every portfolio at once
+        if attr_name in _PORTFOLIO_ATTRS:
+            raise NotImplementedError(f"Cannot set portfolio state {attr_name!r} of BatchStockTradingEnv")
+        if not self._covers_all(indices):
+            raise NotImplementedError("BatchStockTradingEnv attributes are shared by all portfolios")
+        setattr(self.env, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        if method_name in _PORTFOLIO_METHODS:
+            raise NotImplementedError(
+                f"BatchStockTradingEnv cannot call {method_name!r} for single portfolios; "
+                "use the VecEnv reset/step"
+            )
+        # The shared env is called once and its result reported for each portfolio
+        result = getattr(self.env, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._indices(indices))
+
+    def env_is_wrapped(self, wrapper_class: Type[gym.Wrapper], indices=None) -> List[bool]:
+        return [False] * len(self._indices(indices))
@@ -40,8 +40,10 @@ class DiscreteActionWrapper(gym.Wrapper):
         # Create action mapping
         self._create_action_mapping()
         
-        # Pre-compute all action combinations for multi-stock
-        self._create_action_combinations()
+        # Place value of each stock's digit when a single discrete action is read
+        # as a base-n_actions_per_stock number,
+        # e.g., for 2 stocks with 5 actions each: action 0 = [0,0], action 1 = [1,0], ..., action 24 = [4,4]
+        self._action_radix = n_actions_per_stock ** np.arange(self.n_stocks, dtype=np.int64)
     
     def _create_action_mapping(self):
         """Create mapping from discrete actions to continuous values"""
@@ -59,22 +61,6 @@ class DiscreteActionWrapper(gym.Wrapper):
             # Generic linear mapping
             self.discrete_to_continuous = np.linspace(-1.0, 1.0, self.n_actions_per_stock)
     
-    def _create_action_combinations(self):
-        """Pre-compute all action combinations for multi-stock scenarios"""
-        # For multi-stock, we need to map a single discrete action to 
-        # a combination of actions for each stock
-        # e.g., for 2 stocks with 5 actions each: action 0 = [0,0], action 1 = [0,1], ..., action 24 = [4,4]
-        
-        total_actions = self.n_actions_per_stock ** self.n_stocks
-        self.action_to_stock_actions = np.zeros((total_actions, self.n_stocks), dtype=np.int32)
-        
-        for action_idx in range(total_actions):
-            # Convert single action to multi-stock actions using base conversion
-            temp = action_idx
-            for stock_idx in range(self.n_stocks):
-                self.action_to_stock_actions[action_idx, stock_idx] = temp % self.n_actions_per_stock
-                temp //= self.n_actions_per_stock
-    
     def step(self, action: int) -> Tuple[np.ndarray, float, bool, bool, dict]:
         """
         Convert discrete action to continuous and step the environment
@@ -85,14 +71,11 @@ class DiscreteActionWrapper(gym.Wrapper):
         Returns:
             observation, reward, terminated, truncated, info
         """
-        # Convert single discrete action to multi-stock discrete actions
-        stock_actions = self.action_to_stock_actions[action]
+        # Convert single discrete action to multi-stock discrete actions (base conversion)
+        stock_actions = (int(action) // self._action_radix) % self.n_actions_per_stock
         
         # Convert discrete actions to continuous
-        continuous_action = np.array([
-            self.discrete_to_continuous[stock_action] 
-            for stock_action in stock_actions
-        ])
+        continuous_action = self.discrete_to_continuous[stock_actions]
         
         # Step the base environment with continuous action
         return self.env.step(continuous_action)
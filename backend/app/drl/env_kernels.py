@@ -0,0 +1,279 @@
+"""Numba-compiled kernels for the stock trading environment hot path"""
+import math
+from numba import njit, types
+
+# Explicit signatures compile the kernels when this module is imported (loaded
+# from the on-disk cache after the first run) instead of on the first env step.
+# Market data rows are read-only float32 views, holdings and observations are
+# float32, cash and target values are float64.
+_ROW = types.Array(types.float32, 1, 'C', readonly=True)
+_TABLE = types.Array(types.float32, 2, 'C', readonly=True)
+_VEC32 = types.Array(types.float32, 1, 'C')
+_MAT32 = types.Array(types.float32, 2, 'C')
+_VEC64 = types.Array(types.float64, 1, 'C')
+_MAT64 = types.Array(types.float64, 2, 'C')
+
+# Share of the total asset value allocated to positions; the rest is a cash buffer
+INVESTABLE_FRACTION = 0.95
+
+
+@njit(cache=True, fastmath=True)
+def fast_tanh(x):
+    """
+    Rational (Pade) approximation of tanh, exact at 0 and saturating at |x| >= 3
+    
+    Max absolute error is about 0.024, for roughly a third of the cost of math.tanh.
+    """
+    x = min(max(x, -3.0), 3.0)
+    x2 = x * x
+    return x * (27 + x2) / (27 + 9 * x2)
+
+
+@njit(cache=True, fastmath=True)
+def _squash(x, approx):
+    """tanh, or its fast approximation when ``approx`` is set"""
+    if approx:
+        return fast_tanh(x)
+    return math.tanh(x)
+
+
+@njit(
+    types.void(_TABLE, _TABLE, _TABLE, _TABLE, types.boolean, types.Array(types.float32, 3, 'C')),
+    cache=True,
+    fastmath=True
+)
+def market_features(close, prev_close, macd, rsi, approx_tanh, out):
+    """
+    Precompute the squashed per-stock state features that depend only on market data
+
+    Args:
+        close: Shape (days, N) - closing prices
+        prev_close: Shape (days, N) - previous day's closing prices
+        macd: Shape (days, N) - MACD per stock
+        rsi: Shape (days, N) - RSI per stock
+        approx_tanh: Use fast_tanh instead of math.tanh
+        out: Shape (days, N, 3) - filled with (daily return, RSI, MACD) features
+    """
+    for t in range(close.shape[0]):
+        for i in range(close.shape[1]):
+            price = close[t, i]
+            prev = prev_close[t, i]
+            daily_return = (price - prev) / prev if prev > 0 else 0.0
+
+            out[t, i, 0] = _squash(daily_return * 10, approx_tanh)  # Amplify signal
+            out[t, i, 1] = _squash((rsi[t, i] - 50) / 50, approx_tanh)
+            out[t, i, 2] = _squash(macd[t, i] / (price + 1e-8), approx_tanh)
+
+
+@njit(
+    _VEC32(_ROW, _TABLE, _VEC32, types.float64, types.float64, types.float64, types.boolean, _VEC32),
+    cache=True,
+    fastmath=True
+)
+def build_state(
+    close_row,
+    features,
+    shares,
+    amount,
+    total_asset,
+    initial_amount,
+    approx_tanh,
+    out
+):
+    """
+    Fill ``out`` with the environment state for one day in a single pass
+
+    Layout: [cash ratio, portfolio return, (position, daily return, RSI, MACD) * N]
+
+    Args:
+        close_row: Shape (N,) - closing prices for the current day
+        features: Shape (N, 3) - the day's precomputed market_features
+        shares: Shape (N,) - current holdings
+        amount: Current cash
+        total_asset: Current total asset value
+        initial_amount: Initial cash amount
+        approx_tanh: Use fast_tanh instead of math.tanh
+        out: Shape (2 + 4 * N,) - output buffer
+
+    Returns:
+        out
+    """
+    cash_ratio = amount / total_asset if total_asset > 0 else 0.0
+    out[0] = _squash(cash_ratio - 0.5, approx_tanh)
+    out[1] = _squash((total_asset - initial_amount) / initial_amount, approx_tanh)
+
+    for i in range(close_row.shape[0]):
+        position_ratio = close_row[i] * shares[i] / total_asset if total_asset > 0 else 0.0
+
+        j = 2 + 4 * i
+        out[j] = _squash(position_ratio, approx_tanh)
+        out[j + 1] = features[i, 0]
+        out[j + 2] = features[i, 1]
+        out[j + 3] = features[i, 2]
+
+    return out
+
+
+@njit(
+    [
+        types.void(types.Array(types.float32, 1, 'A'), types.float64, _VEC64),
+        types.void(types.Array(types.float64, 1, 'A'), types.float64, _VEC64),
+    ],
+    cache=True,
+    fastmath=True
+)
+def target_values_into(action, investable_amount, out):
+    """
+    Split ``investable_amount`` across stocks by the softmax of ``action``
+
+    Computed in float64 without temporaries; the max is subtracted before
+    exponentiating for numerical stability.
+
+    Args:
+        action: Shape (N,) - raw policy action per stock
+        investable_amount: Cash value to allocate
+        out: Shape (N,) - filled with the target position values
+    """
+    n = action.shape[0]
+    peak = float(action[0])
+    for i in range(1, n):
+        peak = max(peak, float(action[i]))
+
+    total = 0.0
+    for i in range(n):
+        out[i] = math.exp(float(action[i]) - peak)
+        total += out[i]
+
+    scale = investable_amount / total
+    for i in range(n):
+        out[i] *= scale
+
+
+@njit(
+    types.UniTuple(types.float64, 2)(_ROW, _VEC32, _VEC64, types.float64, types.float64),
+    cache=True
+)
+def execute_trades(prices, shares, target_values, amount, cost_pct):
+    """
+    Trade each stock towards its target position value, updating ``shares`` in place
+
+    Stocks are processed in order and share the same cash balance, so earlier
+    buys reduce the cash available to later ones exactly as in a sequential loop.
+    The post-trade value of the holdings is accumulated in the same pass, so the
+    caller does not have to read the price row again.
+
+    Args:
+        prices: Shape (N,) - execution prices
+        shares: Shape (N,) - current holdings, modified in place
+        target_values: Shape (N,) - target position value per stock
+        amount: Available cash
+        cost_pct: Transaction cost percentage
+
+    Returns:
+        (remaining cash after all trades, total value of the stocks held)
+    """
+    stock_value = 0.0
+    for i in range(prices.shape[0]):
+        # Cash arithmetic is done in float64 even when prices are float32
+        price = float(prices[i])
+        value_diff = target_values[i] - price * shares[i]
+
+        if value_diff > 0:  # Need to buy
+            # Calculate max buyable amount, leaving 1% buffer
+            max_buy_value = min(amount * 0.99, value_diff)
+            shares_to_buy = int(max_buy_value / (price * (1 + cost_pct)))
+
+            if shares_to_buy > 0:
+                amount -= price * shares_to_buy * (1 + cost_pct)
+                shares[i] += shares_to_buy
+
+        elif value_diff < 0 and shares[i] > 0:  # Need to sell
+            shares_to_sell = int(min(-value_diff / price, shares[i]))
+
+            if shares_to_sell > 0:
+                amount += price * shares_to_sell * (1 - cost_pct)
+                shares[i] -= shares_to_sell
+
+        stock_value += price * shares[i]
+
+    return amount, stock_value
+
+
+@njit(
+    _MAT32(_ROW, _TABLE, _MAT32, _VEC64, _VEC64, types.float64, types.boolean, _MAT32),
+    cache=True,
+    fastmath=True
+)
+def build_state_batch(
+    close_row,
+    features,
+    shares,
+    amount,
+    total_asset,
+    initial_amount,
+    approx_tanh,
+    out
+):
+    """
+    build_state for K portfolios trading the same day
+
+    Args:
+        shares: Shape (K, N) - holdings per portfolio
+        amount: Shape (K,) - cash per portfolio
+        total_asset: Shape (K,) - total asset value per portfolio
+        out: Shape (K, 2 + 4 * N) - output buffer
+
+    The remaining arguments are as in build_state.
+
+    Returns:
+        out
+    """
+    for k in range(shares.shape[0]):
+        build_state(
+            close_row, features,
+            shares[k], amount[k], total_asset[k], initial_amount, approx_tanh, out[k]
+        )
+    return out
+
+
+@njit(
+    [
+        types.void(types.Array(types.float32, 2, 'A'), _VEC64, _MAT64),
+        types.void(types.Array(types.float64, 2, 'A'), _VEC64, _MAT64),
+    ],
+    cache=True,
+    fastmath=True
+)
+def target_values_batch(actions, investable_amount, out):
+    """
+    target_values_into for K portfolios
+
+    Args:
+        actions: Shape (K, N) - raw policy actions per portfolio
+        investable_amount: Shape (K,) - cash value to allocate per portfolio
+        out: Shape (K, N) - filled with the target position values
+    """
+    for k in range(actions.shape[0]):
+        target_values_into(actions[k], investable_amount[k], out[k])
+
+
+@njit(
+    types.void(_ROW, _MAT32, _MAT64, _VEC64, types.float64, _VEC64),
+    cache=True
+)
+def execute_trades_batch(prices, shares, target_values, amount, cost_pct, stock_value):
+    """
+    execute_trades for K portfolios trading at the same prices
+
+    Args:
+        prices: Shape (N,) - execution prices
+        shares: Shape (K, N) - holdings per portfolio, modified in place
+        target_values: Shape (K, N) - target position values per portfolio
+        amount: Shape (K,) - cash per portfolio, modified in place
+        cost_pct: Transaction cost percentage
+        stock_value: Shape (K,) - filled with the post-trade holdings value
+    """
+    for k in range(shares.shape[0]):
+        amount[k], stock_value[k] = execute_trades(
+            prices, shares[k], target_values[k], amount[k], cost_pct
+        )
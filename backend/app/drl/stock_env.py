@@ -5,6 +5,10 @@ import logging
 import gymnasium as gym
 from gymnasium import spaces
 
+from .env_kernels import (
+    INVESTABLE_FRACTION, build_state, execute_trades, market_features, target_values_into
+)
+
 logger = logging.getLogger(__name__)
 
 ARY = np.ndarray
@@ -27,7 +31,8 @@ class CustomStockTradingEnv(gym.Env):
         cost_pct: float = 0.001,
         gamma: float = 0.99,
         beg_idx: int = 0,
-        end_idx: Optional[int] = None
+        end_idx: Optional[int] = None,
+        fast_tanh: bool = False
     ):
         """
         Initialize trading environment
@@ -41,6 +46,9 @@ class CustomStockTradingEnv(gym.Env):
             gamma: Discount factor for rewards
             beg_idx: Beginning index in data
             end_idx: Ending index in data (None for all data)
+            fast_tanh: Squash state features with a fast tanh approximation
+                (max error ~0.024); models must be used with the setting they
+                were trained with
         """
         super().__init__()
         
@@ -48,24 +56,35 @@ class CustomStockTradingEnv(gym.Env):
         if end_idx is None:
             end_idx = len(close_ary)
         
-        self.close_ary = close_ary[beg_idx:end_idx]
-        self.tech_ary = tech_ary[beg_idx:end_idx]
+        # Stored as C-contiguous float32 to match the observation dtype and
+        # halve the bytes read per step
+        self.close_ary = np.ascontiguousarray(close_ary[beg_idx:end_idx], dtype=np.float32)
+        self.tech_ary = np.ascontiguousarray(tech_ary[beg_idx:end_idx], dtype=np.float32)
+        
+        # Market data is never modified after this point; rows are handed out as views
+        self.close_ary.flags.writeable = False
+        self.tech_ary.flags.writeable = False
         
         logger.info(f"Environment initialized with close_ary shape: {self.close_ary.shape}")
         logger.info(f"Environment initialized with tech_ary shape: {self.tech_ary.shape}")
         
-        # Trading parameters
-        self.initial_amount = initial_amount
+        # Trading parameters. Cash and asset values stay float64: float32 only
+        # resolves ~0.06 at a 1e6 portfolio, which would quantize the reward;
+        # prices, holdings and the state are float32.
+        self.initial_amount = float(initial_amount)
         self.max_stock = max_stock
-        self.cost_pct = cost_pct
+        self.cost_pct = float(cost_pct)
         self.gamma = gamma
+        self._terminal_coef = 1 / (1 - gamma)  # Weight of the mean step reward added at episode end
+        self.fast_tanh = bool(fast_tanh)
         # 增大reward_scale以提供更明显的奖励信号
         # 从2^-12 (0.000244) 提高到2^-8 (0.00391)
         self.reward_scale = 2 ** -8  # 修改为更大的奖励缩放
         
         # Environment state
         self.day = None
-        self.rewards = None
+        self._reward_sum = 0.0  # Running sum/count of step rewards for the terminal bonus
+        self._reward_count = 0
         self.total_asset = None
         self.cumulative_returns = 0
         self.if_random_reset = False  # Deterministic reset for stability
@@ -85,6 +104,44 @@ class CustomStockTradingEnv(gym.Env):
         self.max_step = self.close_ary.shape[0] - 1
         self.target_return = +np.inf
         
+        # The state uses two of each stock's 8 indicators: MACD (indicator 0) and
+        # RSI (indicator 3)
+        if self.tech_ary.shape[1] < 8 * self.shares_num:
+            raise ValueError(
+                f"tech_ary must have at least 8 indicators per stock, got "
+                f"{self.tech_ary.shape[1]} columns for {self.shares_num} stocks"
+            )
+        tech_idx = np.arange(self.shares_num) * 8
+        
+        # Daily return, RSI and MACD features depend only on the day, so they are
+        # squashed once here as (days, N, 3); get_state only adds the portfolio
+        # features. Day 0's previous close is its own close.
+        prev_close = np.empty_like(self.close_ary)
+        prev_close[0] = self.close_ary[0]
+        prev_close[1:] = self.close_ary[:-1]
+        self._market_features = np.empty((*self.close_ary.shape, 3), dtype=np.float32)
+        market_features(
+            self.close_ary,
+            prev_close,
+            np.ascontiguousarray(self.tech_ary[:, tech_idx]),
+            np.ascontiguousarray(self.tech_ary[:, tech_idx + 3]),
+            self.fast_tanh,
+            self._market_features
+        )
+        self._market_features.flags.writeable = False
+        
+        # Two state buffers filled in place by the compiled state kernel and
+        # returned alternately, so the previous observation stays valid for one
+        # more call (DummyVecEnv keeps the terminal observation across reset)
+        self._state_bufs = np.empty((2, self.state_dim), dtype=np.float32)
+        self._state_buf_idx = 0
+        
+        # Target position values handed to the trade kernel (float64, whatever
+        # the action dtype); single-stock envs (e.g. behind
+        # DiscreteActionWrapper) skip the softmax
+        self._target_values = np.zeros(self.shares_num)
+        self._single_stock = self.shares_num == 1
+        
         # Gymnasium spaces (required by Stable-Baselines3)
         self.observation_space = spaces.Box(
             low=-np.inf,
@@ -113,14 +170,14 @@ class CustomStockTradingEnv(gym.Env):
             self.amount = self.initial_amount * np.random.uniform(0.9, 1.1)
             self.shares = (
                 np.abs(np.random.randn(self.shares_num).clip(-2, +2)) * 2 ** 6
-            ).astype(int)
+            ).astype(np.float32)
         else:
             self.amount = self.initial_amount
             self.shares = np.zeros(self.shares_num, dtype=np.float32)
         
-        self.rewards = []
-        self.total_asset = (self.close_ary[self.day] * self.shares).sum() + self.amount
-        self.prev_prices = self.close_ary[0].copy()  # Initialize previous prices
+        self._reward_sum = 0.0
+        self._reward_count = 0
+        self.total_asset = (self.close_ary[self.day] * self.shares).sum(dtype=np.float64) + self.amount
         
         return self.get_state(), {}
     
@@ -131,47 +188,24 @@ class CustomStockTradingEnv(gym.Env):
         State composition:
         1. Financial state (2 dims): cash ratio, portfolio return
         2. Per stock (4 dims): position ratio, daily return, normalized RSI, normalized MACD
-        """
-        day_idx = min(self.day, len(self.close_ary) - 1)
-        current_prices = self.close_ary[day_idx]
-        
-        # 1. Financial state (2 dims)
-        cash_ratio = self.amount / self.total_asset if self.total_asset > 0 else 0
-        portfolio_return = (self.total_asset - self.initial_amount) / self.initial_amount
-        
-        state_parts = [
-            np.tanh(cash_ratio - 0.5),   # Cash ratio (normalized)
-            np.tanh(portfolio_return)     # Total return
-        ]
         
-        # 2. Per stock state (4 dims each)
-        stock_values = current_prices * self.shares
-        for i in range(self.shares_num):
-            # Position ratio (stock value / total asset)
-            position_ratio = stock_values[i] / self.total_asset if self.total_asset > 0 else 0
-            
-            # Daily return
-            daily_return = (current_prices[i] - self.prev_prices[i]) / self.prev_prices[i] \
-                          if self.prev_prices[i] > 0 else 0
-            
-            # Normalized technical indicators
-            tech_idx = i * 8  # 8 indicators per stock
-            # RSI (indicator 3)
-            rsi_raw = self.tech_ary[day_idx, tech_idx + 3] if tech_idx + 3 < self.tech_ary.shape[1] else 50
-            rsi_norm = np.tanh((rsi_raw - 50) / 50)
-            
-            # MACD (indicator 0)
-            macd_raw = self.tech_ary[day_idx, tech_idx] if tech_idx < self.tech_ary.shape[1] else 0
-            macd_norm = np.tanh(macd_raw / (current_prices[i] + 1e-8))
-            
-            state_parts.extend([
-                np.tanh(position_ratio),
-                np.tanh(daily_return * 10),  # Amplify signal
-                rsi_norm,
-                macd_norm
-            ])
-        
-        return np.array(state_parts, dtype=np.float32)
+        The returned array is an internal buffer that is overwritten two calls
+        later; copy it if it must outlive the next step.
+        """
+        self._state_buf_idx ^= 1
+        state = self._state_bufs[self._state_buf_idx]
+        # step never rebuilds the state past the last day, so self.day is in range
+        build_state(
+            self.close_ary[self.day],
+            self._market_features[self.day],
+            self.shares,
+            self.amount,
+            self.total_asset,
+            self.initial_amount,
+            self.fast_tanh,
+            state
+        )
+        return state
     
     def step(self, action: ARY) -> Tuple[ARY, float, bool, bool, dict]:
         """
@@ -191,66 +225,44 @@ class CustomStockTradingEnv(gym.Env):
         
         # Check if we've reached the end of data BEFORE processing
         if self.day >= len(self.close_ary):
-            # Episode is done, return final state
+            # Episode is done; nothing has traded since the last observation, so
+            # return that final state again instead of rebuilding it
             terminal = True
-            state = self.get_state() if self.day > 0 else np.zeros(self.state_dim, dtype=np.float32)
+            state = self._state_bufs[self._state_buf_idx]
             reward = 0.0
-            if self.rewards:
-                reward = 1 / (1 - self.gamma) * np.mean(self.rewards)
+            if self._reward_count:
+                reward = self._terminal_coef * (self._reward_sum / self._reward_count)
             return state, reward, terminal, False, {}
         
-        # Update previous prices
-        if self.day > 0:
-            self.prev_prices = self.close_ary[self.day - 1].copy()
-        
         # === New action processing: Target position ratios ===
         current_prices = self.close_ary[self.day]
+        investable_amount = self.total_asset * INVESTABLE_FRACTION  # Reserve 5% cash buffer
         
-        # 1. Softmax normalization to get target weights
-        exp_action = np.exp(action - np.max(action))  # Numerical stability
-        target_weights = exp_action / exp_action.sum()
-        
-        # 2. Calculate target position values
-        investable_amount = self.total_asset * 0.95  # Reserve 5% cash buffer
-        target_values = investable_amount * target_weights
-        
-        # 3. Calculate current position values
-        current_values = current_prices * self.shares
+        target_values = self._target_values
+        if self._single_stock:
+            # Softmax of a single action is always 1: target the whole investable amount
+            target_values[0] = investable_amount
+        else:
+            # Softmax normalization of the action gives the target weights
+            target_values_into(np.asarray(action).reshape(-1), investable_amount, target_values)
         
-        # 4. Execute trades to reach target positions
-        for i in range(self.action_dim):
-            value_diff = target_values[i] - current_values[i]
-            price = current_prices[i]
-            
-            if value_diff > 0:  # Need to buy
-                # Calculate max buyable amount
-                max_buy_value = min(self.amount * 0.99, value_diff)  # Leave 1% buffer
-                shares_to_buy = int(max_buy_value / (price * (1 + self.cost_pct)))
-                
-                if shares_to_buy > 0:
-                    cost = price * shares_to_buy * (1 + self.cost_pct)
-                    self.amount -= cost
-                    self.shares[i] += shares_to_buy
-                    
-            elif value_diff < 0 and self.shares[i] > 0:  # Need to sell
-                shares_to_sell = int(min(abs(value_diff) / price, self.shares[i]))
-                
-                if shares_to_sell > 0:
-                    proceeds = price * shares_to_sell * (1 - self.cost_pct)
-                    self.amount += proceeds
-                    self.shares[i] -= shares_to_sell
+        # Execute trades to reach target positions
+        self.amount, stock_value = execute_trades(
+            current_prices, self.shares, target_values, self.amount, self.cost_pct
+        )
         
         # Calculate reward
-        total_asset = (current_prices * self.shares).sum() + self.amount
+        total_asset = stock_value + self.amount
         reward = (total_asset - self.total_asset) * self.reward_scale
-        self.rewards.append(reward)
+        self._reward_sum += reward
+        self._reward_count += 1
         self.total_asset = total_asset
         
         # Check if episode is done
         terminal = self.day >= self.max_step
         if terminal:
             # Add terminal reward
-            reward += 1 / (1 - self.gamma) * np.mean(self.rewards)
+            reward += self._terminal_coef * (self._reward_sum / self._reward_count)
             self.cumulative_returns = total_asset / self.initial_amount
         
         state = self.get_state()
@@ -260,7 +272,7 @@ class CustomStockTradingEnv(gym.Env):
     
     def get_total_asset(self) -> float:
         """Get current total asset value"""
-        # Ensure day index is within bounds
-        day_idx = min(self.day, len(self.close_ary) - 1)
-        return (self.close_ary[day_idx] * self.shares).sum() + self.amount
+        # Maintained by reset and step from the holdings value the trade kernel
+        # accumulates; prices do not move between steps
+        return self.total_asset
 
@@ -11,6 +11,7 @@ import logging
 # Import Stable-Baselines3
 from stable_baselines3 import PPO, DQN, SAC, TD3, A2C
 from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env import VecMonitor
 
 # Import custom logger
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -20,6 +21,19 @@ from utils.logger import trainer_logger as logger
 class ProgressCallback(BaseCallback):
     """Custom callback for progress tracking"""
     
+    # Algorithm-specific loss keys, in order of preference
+    # PPO/A2C: policy_loss, value_loss, loss
+    # DQN: loss
+    # SAC: actor_loss, critic_loss, ent_coef_loss
+    # TD3: actor_loss, critic_loss
+    LOSS_KEYS = (
+        'train/loss',           # DQN, general
+        'train/policy_loss',    # PPO, A2C
+        'train/value_loss',     # PPO, A2C (critic)
+        'train/actor_loss',     # SAC, TD3
+        'train/critic_loss',    # SAC, TD3
+    )
+    
     def __init__(self, callback_fn: Optional[Callable], total_timesteps: int, verbose: int = 0):
         """
         Args:
@@ -36,6 +50,10 @@ class ProgressCallback(BaseCallback):
         self.update_interval = 100  # Update progress every 100 steps
         self.last_loss = 0.0  # Track last loss value
         self.last_reward = 0.0  # Track last reward value
+        self._last_ep_info = None  # Newest episode seen by the cached reward mean
+        self._avg_reward = 0.0
+        self._loss_key: Optional[str] = None  # Logger key of this algorithm's loss
+        self._name_to_value: Optional[dict] = None  # The model logger's value dict
         
     def _on_step(self) -> bool:
         """Called after each step"""
@@ -46,37 +64,36 @@ class ProgressCallback(BaseCallback):
             # Calculate progress (0-1000 scale)
             progress = int((self.num_timesteps / self.total_timesteps) * 1000)
             
-            # Get episode reward from rollout buffer if available
-            avg_reward = 0.0
-            if hasattr(self.model, 'ep_info_buffer') and len(self.model.ep_info_buffer) > 0:
-                avg_reward = np.mean([ep_info['r'] for ep_info in self.model.ep_info_buffer])
+            # Get episode reward from rollout buffer if available; the mean is
+            # only recomputed when a new episode has finished since the last update
+            ep_info_buffer = getattr(self.model, 'ep_info_buffer', None)
+            if ep_info_buffer and ep_info_buffer[-1] is not self._last_ep_info:
+                self._last_ep_info = ep_info_buffer[-1]
+                self._avg_reward = sum(ep_info['r'] for ep_info in ep_info_buffer) / len(ep_info_buffer)
+            avg_reward = self._avg_reward
             
             # Get loss from logger if available
             # Different algorithms use different logger keys
             avg_loss = 0.0
-            if hasattr(self.model, 'logger') and self.model.logger is not None:
+            if self._loss_key is not None:
+                # The logger clears its values on every dump; keep reporting
+                # the last loss until the next one is logged
+                avg_loss = self._name_to_value.get(self._loss_key, self.last_loss)
+            elif hasattr(self.model, 'logger') and self.model.logger is not None:
                 try:
-                    if hasattr(self.model.logger, 'name_to_value'):
-                        # Try algorithm-specific loss keys
-                        # PPO/A2C: policy_loss, value_loss, loss
-                        # DQN: loss
-                        # SAC: actor_loss, critic_loss, ent_coef_loss  
-                        # TD3: actor_loss, critic_loss
-                        loss_keys = [
-                            'train/loss',           # DQN, general
-                            'train/policy_loss',    # PPO, A2C
-                            'train/value_loss',     # PPO, A2C (critic)
-                            'train/actor_loss',     # SAC, TD3
-                            'train/critic_loss',    # SAC, TD3
-                        ]
-                        
-                        # Get first available loss
-                        for key in loss_keys:
-                            if key in self.model.logger.name_to_value:
-                                avg_loss = self.model.logger.name_to_value[key]
-                                break
+                    name_to_value = getattr(self.model.logger, 'name_to_value', None)
+                    if name_to_value is not None:
+                        # Resolve the algorithm's loss key and the logger's value
+                        # dict once, on the first poll after training has logged
+                        # a loss; both stay fixed for the rest of learn()
+                        self._loss_key = next(
+                            (key for key in self.LOSS_KEYS if key in name_to_value), None
+                        )
+                        if self._loss_key is not None:
+                            self._name_to_value = name_to_value
+                            avg_loss = name_to_value[self._loss_key]
                 except Exception as e:
-                    logger.debug(f"Failed to get loss from logger: {e}")
+                    logger.debug("Failed to get loss from logger: %s", e)
             
             # Store last values for final reporting
             self.last_loss = float(avg_loss)
@@ -93,8 +110,8 @@ class ProgressCallback(BaseCallback):
             
             # Log progress
             if self.verbose > 0:
-                logger.debug(f"Progress: {self.num_timesteps}/{self.total_timesteps}, "
-                           f"Reward: {avg_reward:.2f}, Loss: {avg_loss:.4f}")
+                logger.debug("Progress: %d/%d, Reward: %.2f, Loss: %.4f",
+                             self.num_timesteps, self.total_timesteps, avg_reward, avg_loss)
         
         return True
 
@@ -111,7 +128,19 @@ class DRLTrainer:
         "A2C": A2C,
     }
     
-    def __init__(self, env, algorithm: str, model_dir: str, progress_callback: Callable = None):
+    # On-policy algorithms collect rollouts from several env copies at once
+    VECTORIZED_ALGORITHMS = ("PPO", "A2C")
+    
+    def __init__(
+        self,
+        env,
+        algorithm: str,
+        model_dir: str,
+        progress_callback: Callable = None,
+        n_envs: int = 1,
+        num_threads: int = 0,
+        compile_policy: bool = False
+    ):
         """
         Initialize trainer
         
@@ -120,12 +149,18 @@ class DRLTrainer:
             algorithm: Algorithm name (PPO, DQN, SAC, TD3, A2C)
             model_dir: Directory to save model
             progress_callback: Callback function(epoch, loss, reward, status)
+            n_envs: Parallel env copies for PPO/A2C rollouts (ignored by other algorithms)
+            num_threads: Torch intra-op threads when training on CPU (0 keeps torch's default)
+            compile_policy: Run the policy's MLP layers through torch.compile during training
         """
         self.base_env = env  # Keep reference to base environment
         self.algorithm = algorithm
         self.model_dir = Path(model_dir)
         self.model_dir.mkdir(parents=True, exist_ok=True)
         self.progress_callback = progress_callback
+        self.compile_policy = compile_policy
+        # Modules whose forward _compile_policy replaced, restored after training
+        self._compiled_modules = []
         
         if algorithm not in self.AGENT_MAP:
             raise ValueError(f"Unknown algorithm: {algorithm}. Available: {list(self.AGENT_MAP.keys())}")
@@ -133,6 +168,10 @@ class DRLTrainer:
         self.agent_class = self.AGENT_MAP[algorithm]
         self.model = None
         self.device = "cuda" if th.cuda.is_available() else "cpu"
+        if self.device == "cpu" and num_threads > 0:
+            # The policies are small MLPs: extra threads mostly add OpenMP
+            # synchronization and oversubscribe cores shared with concurrent jobs
+            th.set_num_threads(num_threads)
         
         # Apply discrete action wrapper for DQN
         if algorithm == "DQN":
@@ -142,10 +181,18 @@ class DRLTrainer:
         else:
             self.env = env
         
+        # Evaluation always steps a single env
+        self.eval_env = self.env
+        self.n_envs = n_envs if algorithm in self.VECTORIZED_ALGORITHMS else 1
+        if self.n_envs > 1:
+            from app.drl.batch_env import BatchStockTradingEnv
+            self.env = VecMonitor(BatchStockTradingEnv(env, self.n_envs))
+            logger.info(f"Vectorized {algorithm} rollouts over {self.n_envs} env copies")
+        
         logger.info(f"=" * 70)
         logger.info(f"INITIALIZING DRL TRAINER (Stable-Baselines3)")
         logger.info(f"Algorithm: {algorithm}")
-        logger.info(f"Device: {self.device}")
+        logger.info(f"Device: {self.device} (torch threads: {th.get_num_threads()})")
         logger.info(f"Model Directory: {model_dir}")
         logger.info(f"Environment: state_dim={self.env.observation_space.shape}, "
                    f"action_dim={self.env.action_space.shape if hasattr(self.env.action_space, 'shape') else self.env.action_space.n}, "
@@ -197,7 +244,8 @@ class DRLTrainer:
             # ElegantRL recommendation: n_steps=max_step*2-8, batch_size=256-512, n_epochs=10-16
             kwargs.update({
                 "policy_kwargs": dict(net_arch=[256, 128]),  # Network architecture
-                "n_steps": max(max_step * 2, 1024),  # Collect 2x episode length
+                # Collect 2x episode length per update, split across env copies
+                "n_steps": max(max_step * 2, 1024) // self.n_envs,
                 "batch_size": 256,  # Larger batch for stability
                 "n_epochs": 16,  # More epochs for better convergence
                 "gamma": 0.99,  # Discount factor
@@ -207,14 +255,15 @@ class DRLTrainer:
                 "vf_coef": 0.5,  # Value function coefficient
                 "max_grad_norm": 0.5,  # Gradient clipping
             })
-            logger.info(f"PPO: n_steps={kwargs['n_steps']}, batch_size=256, n_epochs=16")
+            logger.info(f"PPO: n_steps={kwargs['n_steps']} x {self.n_envs} envs, batch_size=256, n_epochs=16")
             
         elif self.algorithm == "A2C":
             # A2C: On-policy synchronous actor-critic
             # ElegantRL recommendation: n_steps=max_step*2-4, learning_rate=2e-4 to 4e-4
             kwargs.update({
                 "policy_kwargs": dict(net_arch=[256, 128]),
-                "n_steps": max(max_step * 2, 512),  # Collect 2x episode length
+                # Collect 2x episode length per update, split across env copies
+                "n_steps": max(max_step * 2, 512) // self.n_envs,
                 "gamma": 0.99,
                 "gae_lambda": 0.97,  # Increased from 1.0 for better variance reduction
                 "ent_coef": 0.02,  # Increased from 0.0 for exploration
@@ -225,7 +274,7 @@ class DRLTrainer:
             })
             # Override learning rate for A2C (higher than default)
             kwargs["learning_rate"] = 3e-4
-            logger.info(f"A2C: n_steps={kwargs['n_steps']}, learning_rate=3e-4, normalize_advantage=True")
+            logger.info(f"A2C: n_steps={kwargs['n_steps']} x {self.n_envs} envs, learning_rate=3e-4, normalize_advantage=True")
             
         elif self.algorithm == "DQN":
             # DQN: Off-policy value-based algorithm with discrete actions
@@ -304,6 +353,9 @@ class DRLTrainer:
             verbose=verbose
         )
         
+        if self.compile_policy:
+            self._compile_policy()
+        
         # Train
         start_time = time.time()
         try:
@@ -318,6 +370,9 @@ class DRLTrainer:
         except Exception as e:
             logger.error(f"Training failed: {e}", exc_info=True)
             raise
+        finally:
+            # Evaluation and later loads use the eager modules
+            self._restore_policy()
         
         # Evaluate final performance
         logger.info(f"Evaluating final model performance...")
@@ -355,11 +410,64 @@ class DRLTrainer:
             "final_loss": float(final_loss),  # Include loss in results
             "best_reward": float(final_reward),  # SB3 doesn't track best separately during training
         }
-        logger.debug(f"Training results: {results}")
+        logger.debug("Training results: %s", results)
         logger.info(f"Final loss from training: {final_loss:.4f}")
         
         return results
     
+    def _compile_policy(self):
+        """
+        Run the policy's MLP layers through torch.compile for the training run
+        
+        The algorithms reach their networks by different paths - PPO/A2C
+        through forward and evaluate_actions, SAC/TD3 through the actor and
+        critic (and target) aliases, DQN through q_net - so compiling the
+        policy's forward alone leaves most of them eager. Instead every
+        nn.Sequential with parameters (the stacks create_mlp builds) gets a
+        compiled forward on the module itself, which the aliases keep pointing
+        to and which leaves the state_dict keys unchanged.
+        
+        The default mode is used: "reduce-overhead" replays CUDA graphs whose
+        output buffers are reused between calls, while SB3 keeps outputs
+        (values, log-probs, target Q-values) across calls, and it adds nothing
+        on CPU. Compilation takes tens of seconds, so this only pays off for
+        long runs.
+        
+        torch.compile is lazy, so each module is run once here, with and
+        without gradients, to compile it up front; tracing or backend errors
+        then fall back to eager mode instead of failing inside learn().
+        """
+        if not hasattr(th, "compile"):
+            logger.warning("torch.compile requires PyTorch 2.x, training uncompiled policy")
+            return
+        try:
+            for module in self.model.policy.modules():
+                if isinstance(module, th.nn.Sequential) and any(True for _ in module.parameters()):
+                    module.forward = th.compile(module.forward)
+                    self._compiled_modules.append(module)
+                    self._warm_up(module)
+            logger.info(f"Compiled {len(self._compiled_modules)} {self.algorithm} policy layer stacks with torch.compile")
+        except Exception as e:
+            self._restore_policy()
+            logger.warning(f"torch.compile failed, training uncompiled policy: {e}")
+    
+    @staticmethod
+    def _warm_up(module):
+        """Compile a module's forward and backward pass with a dummy batch"""
+        first = next(layer for layer in module if isinstance(layer, th.nn.Linear))
+        x = th.zeros(2, first.in_features, device=first.weight.device)
+        with th.no_grad():
+            module(x)
+        module(x).sum().backward()
+        for param in module.parameters():
+            param.grad = None
+    
+    def _restore_policy(self):
+        """Return the modules compiled by _compile_policy to their eager forward"""
+        for module in self._compiled_modules:
+            vars(module).pop("forward", None)
+        self._compiled_modules.clear()
+    
     def _evaluate(self, num_episodes: int = 5) -> tuple:
         """
         Evaluate the trained model
@@ -374,41 +482,91 @@ class DRLTrainer:
             logger.warning("No model to evaluate")
             return 0.0, 0.0
         
-        logger.debug(f"Evaluating for {num_episodes} episodes...")
+        if not self.base_env.if_random_reset:
+            # Deterministic reset and deterministic actions replay the same
+            # episode every time, so one episode gives the same metrics
+            num_episodes = 1
+        logger.debug("Evaluating for %d episodes...", num_episodes)
+        # Run the episodes without autograd bookkeeping
+        with th.inference_mode():
+            if self.eval_env is self.base_env:
+                rewards = self._evaluate_batched(num_episodes)
+            else:
+                rewards = self._evaluate_sequential(num_episodes)
+        
+        mean_reward = np.mean(rewards)
+        std_reward = np.std(rewards)
+        logger.debug("Evaluation complete: %.2f ± %.2f", mean_reward, std_reward)
+        
+        return mean_reward, std_reward
+    
+    def _evaluate_batched(self, num_episodes: int) -> list:
+        """
+        Run all evaluation episodes side by side in a BatchStockTradingEnv
+        
+        One batched predict per day instead of one per day and episode.
+        
+        Returns:
+            Return rate of each episode
+        """
+        from app.drl.batch_env import BatchStockTradingEnv
+        eval_vec = BatchStockTradingEnv(self.base_env, num_episodes)
+        initial_amount = self.base_env.initial_amount
+        
+        state = eval_vec.reset()
+        final_values = eval_vec.get_total_asset()
+        for _ in range(self.base_env.max_step):
+            # Use deterministic actions for evaluation
+            action, _ = self.model.predict(state, deterministic=True)
+            state, _, dones, infos = eval_vec.step(action)
+            if dones.any():
+                # Finished episodes are reset, their final value is in the infos
+                final_values = np.array([info["total_asset"] for info in infos])
+        
+        rewards = []
+        for i, final_value in enumerate(final_values):
+            return_rate = (final_value - initial_amount) / initial_amount
+            logger.debug("  Episode %d: portfolio $%.2f, return %.4f", i + 1, final_value, return_rate)
+            rewards.append(return_rate)
+        return rewards
+    
+    def _evaluate_sequential(self, num_episodes: int) -> list:
+        """
+        Run evaluation episodes one at a time (used for wrapped envs such as DQN's)
+        
+        Returns:
+            Return rate (or reward sum) of each episode
+        """
         rewards = []
         
         for i in range(num_episodes):
-            state, _ = self.env.reset()
+            state, _ = self.eval_env.reset()
             episode_reward = 0.0
             done = False
             step = 0
             
-            while not done and step < self.env.max_step:
+            while not done and step < self.base_env.max_step:
                 # Use deterministic actions for evaluation
                 action, _ = self.model.predict(state, deterministic=True)
-                state, reward, terminated, truncated, info = self.env.step(action)
+                state, reward, terminated, truncated, info = self.eval_env.step(action)
                 episode_reward += reward
                 done = terminated or truncated
                 step += 1
             
             # Get final portfolio value for calculating return
             # Use environment's total_asset / initial_amount as the true return
-            env_unwrapped = getattr(self.env, 'unwrapped', self.env)
+            env_unwrapped = getattr(self.eval_env, 'unwrapped', self.eval_env)
             if hasattr(env_unwrapped, 'get_total_asset') and hasattr(env_unwrapped, 'initial_amount'):
                 # Calculate return rate from final portfolio value
                 final_value = env_unwrapped.get_total_asset()
                 return_rate = (final_value - env_unwrapped.initial_amount) / env_unwrapped.initial_amount
                 episode_reward = return_rate
-                logger.debug(f"  Episode {i+1}: portfolio ${final_value:.2f}, return {return_rate:.4f}")
+                logger.debug("  Episode %d: portfolio $%.2f, return %.4f", i + 1, final_value, return_rate)
             
             rewards.append(episode_reward)
-            logger.debug(f"  Episode {i+1}/{num_episodes}: reward={episode_reward:.4f}")
+            logger.debug("  Episode %d/%d: reward=%.4f", i + 1, num_episodes, episode_reward)
         
-        mean_reward = np.mean(rewards)
-        std_reward = np.std(rewards)
-        logger.debug(f"Evaluation complete: {mean_reward:.2f} ± {std_reward:.2f}")
-        
-        return mean_reward, std_reward
+        return rewards
     
     def get_model_path(self) -> str:
         """Get path to the trained model"""
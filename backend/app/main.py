@@ -1,23 +1,68 @@
 """FastAPI application entry point"""
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+import asyncio
+import atexit
 import logging
+import logging.handlers
+import queue
+import time
 
 from .config import settings
 from .database import db_manager
+from .services.job_queue import shutdown_executor
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging. Request handlers only enqueue records; a listener
+# thread formats them and does the blocking console I/O.
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 )
+_log_queue = queue.SimpleQueue()
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Formatted by _log_handler
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Flush queued records on exit
 logger = logging.getLogger(__name__)
 
+# Seconds after a successful query during which /health trusts the database
+HEALTH_CHECK_TTL = 5.0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open database connections on startup and close them on shutdown"""
+    try:
+        # The SSH handshake blocks, so it runs off the event loop
+        await asyncio.to_thread(db_manager.start_tunnel)
+        logger.info("SSH tunnel started successfully")
+        
+        # Creating the pool also tests the database connection
+        await db_manager.open_async_pool()
+    except Exception as e:
+        logger.error(f"Failed to initialize database: {e}")
+        raise
+    
+    yield
+    
+    shutdown_executor()
+    await db_manager.close_async_pool()
+    await asyncio.to_thread(db_manager.stop_tunnel)
+    logger.info("SSH tunnel stopped")
+
+
 # Create FastAPI app
 app = FastAPI(
     title="DRL Quantitative Trading API",
     description="Backend API for Deep Reinforcement Learning based quantitative trading",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -29,28 +74,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database connection on startup"""
-    try:
-        db_manager.start_tunnel()
-        logger.info("SSH tunnel started successfully")
-        
-        # Test database connection
-        schema = db_manager.inspect_schema()
-        logger.info(f"Database schema inspected: {len(schema['stock'])} columns in stock table")
-        logger.info(f"Database schema inspected: {len(schema['stock_price'])} columns in stock_price table")
-    except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
-        raise
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup on shutdown"""
-    db_manager.stop_tunnel()
-    logger.info("SSH tunnel stopped")
+# Backtest and sample-data payloads are long float/date arrays that compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 @app.get("/")
@@ -65,10 +90,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; skips the database round-trip while queries are succeeding"""
+    if time.monotonic() - db_manager.last_ok < HEALTH_CHECK_TTL:
+        return {"status": "healthy", "database": "connected"}
+    return await readiness_check()
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness endpoint; always tests the database connection"""
     try:
         # Test database connection
-        db_manager.execute_query("SELECT 1")
+        await db_manager.fetchval("SELECT 1")
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
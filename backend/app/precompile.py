@@ -0,0 +1,37 @@
+"""
+Compile the Numba kernels ahead of the first job
+
+Every kernel module declares explicit signatures, so importing it compiles its
+kernels and writes them to Numba's on-disk cache (``__pycache__`` next to the
+module, or ``NUMBA_CACHE_DIR``). Later processes - the API, job workers and
+parallel backtest workers - then load the machine code from the cache instead
+of compiling on their first import.
+
+Run once after installing or upgrading dependencies:
+
+    python -m app.precompile
+"""
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+KERNEL_MODULES = (
+    "app.drl.env_kernels",
+    "app.drl.backtest_kernels",
+    "app.services.data_kernels",
+)
+
+
+def compile_kernels():
+    """Import each kernel module, compiling (or loading from cache) its kernels"""
+    for name in KERNEL_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        logger.info("%s ready in %.2fs", name, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    compile_kernels()
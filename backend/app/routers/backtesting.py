@@ -1,5 +1,7 @@
 """Backtesting API endpoints"""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import TypeAdapter
+from typing import List
 import logging
 
 from ..models.backtesting import (
@@ -7,16 +9,28 @@ from ..models.backtesting import (
     BacktestStartResponse,
     BacktestResponse,
     BacktestResult,
-    BacktestMetrics,
     BacktestComparison
 )
 from ..services.backtest_service import backtest_service
-from ..utils.storage import load_json, job_exists
+from ..services.job_queue import submit_job
+from ..utils.storage import (
+    BACKTEST_ARRAYS_FILE,
+    BACKTEST_RESULTS_FILE,
+    job_exists,
+    job_files_etag,
+    load_backtest_results
+)
+from ..utils.http import conditional_response
+from ..utils.logger import close_backtest_logger
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/backtesting", tags=["backtesting"])
 
+# Validate stored result lists in one compiled pass instead of building each
+# model by hand
+_results_adapter = TypeAdapter(List[BacktestResult])
+
 
 def run_backtest_job(job_id: str, baseline_strategies: list):
     """Background task to run backtest"""
@@ -26,18 +40,17 @@ def run_backtest_job(job_id: str, baseline_strategies: list):
         logger.info(f"Completed background backtest for job {job_id}")
     except Exception as e:
         logger.error(f"Error in backtest job: {e}", exc_info=True)
+    finally:
+        close_backtest_logger(job_id)
 
 
 @router.post("/start", response_model=BacktestStartResponse)
-async def start_backtest(
-    request: BacktestConfig,
-    background_tasks: BackgroundTasks
-):
+async def start_backtest(request: BacktestConfig):
     """Start backtesting"""
     try:
         job_id = request.jobId
         
-        logger.info(f"Starting backtest for job {job_id}")
+        logger.info("Starting backtest for job %s", job_id)
         
         if not job_exists(job_id):
             raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
@@ -45,23 +58,23 @@ async def start_backtest(
         # Check if backtest already exists (unless force=True)
         from ..utils.storage import get_job_dir
         job_dir = get_job_dir(job_id)
-        backtest_results_file = job_dir / "backtest_results.json"
+        backtest_results_file = job_dir / BACKTEST_RESULTS_FILE
         
         if request.force and backtest_results_file.exists():
             # Delete existing results if force re-run
             backtest_results_file.unlink()
-            logger.info(f"Deleted existing backtest results for force re-run: {job_id}")
+            logger.info("Deleted existing backtest results for force re-run: %s", job_id)
         
         if not backtest_results_file.exists():
             # Only run backtest if results don't exist
-            background_tasks.add_task(
+            submit_job(
                 run_backtest_job,
                 job_id,
                 request.baselineStrategies
             )
-            logger.info(f"Queued backtest job for {job_id}")
+            logger.info("Queued backtest job for %s", job_id)
         else:
-            logger.info(f"Backtest results already exist for {job_id}, skipping")
+            logger.info("Backtest results already exist for %s, skipping", job_id)
         
         return BacktestStartResponse(jobId=job_id)
         
@@ -71,29 +84,24 @@ async def start_backtest(
 
 
 @router.get("/results/{job_id}", response_model=BacktestResponse)
-async def get_backtest_results(job_id: str):
+async def get_backtest_results(job_id: str, request: Request, response: Response):
     """Get backtest results"""
     try:
         if not job_exists(job_id):
             raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
         
+        etag = job_files_etag(job_id, BACKTEST_RESULTS_FILE, BACKTEST_ARRAYS_FILE)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+        
         # Load backtest results
-        backtest_data = load_json(job_id, "backtest_results.json")
+        backtest_data = load_backtest_results(job_id)
         
         # Convert to response model
-        results = [
-            BacktestResult(
-                algorithm=r["algorithm"],
-                type=r["type"],
-                returns=r["returns"],
-                cumulativeReturns=r["cumulativeReturns"],
-                dates=r["dates"],
-                metrics=BacktestMetrics(**r["metrics"])
-            )
-            for r in backtest_data["results"]
-        ]
+        results = _results_adapter.validate_python(backtest_data["results"])
         
-        comparison = BacktestComparison(**backtest_data["comparison"])
+        comparison = BacktestComparison.model_validate(backtest_data["comparison"])
         
         return BacktestResponse(
             jobId=job_id,
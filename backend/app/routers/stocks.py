@@ -1,7 +1,9 @@
 """Stock management API endpoints"""
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from typing import Dict, List, Tuple
+import asyncio
 import logging
+import time
 
 from ..models.stock import (
     StockListRequest,
@@ -14,6 +16,12 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/stocks", tags=["stocks"])
 
+# Autocomplete results per (case-folded) search term with their expiry time;
+# the stock universe changes rarely, so a short TTL keeps it fresh enough
+STOCK_LIST_TTL = 300.0
+STOCK_LIST_CACHE_SIZE = 1024
+_stock_list_cache: Dict[str, Tuple[float, List[dict]]] = {}
+
 
 @router.post("/add", response_model=StockListResponse)
 async def add_stocks(request: StockListRequest):
@@ -22,11 +30,13 @@ async def add_stocks(request: StockListRequest):
     Returns all data for the specified date range
     """
     try:
-        logger.info(f"Fetching data for symbols: {request.symbols}")
-        logger.info(f"Date range: {request.startDate} to {request.endDate}")
+        logger.info("Fetching data for symbols: %s", request.symbols)
+        logger.info("Date range: %s to %s", request.startDate, request.endDate)
         
-        # Fetch and prepare data
-        data = data_service.fetch_and_prepare_data(
+        # Fetch and prepare data; the blocking query and indicator
+        # computation run off the event loop
+        data = await asyncio.to_thread(
+            data_service.fetch_and_prepare_data,
             symbols=request.symbols,
             start_date=request.startDate,
             end_date=request.endDate
@@ -58,6 +68,13 @@ async def get_stock_list(search: str = Query(None, description="Search term")):
     """
     Get list of available stocks (for autocomplete)
     """
+    # ILIKE is case-insensitive, so terms differing only in case share an entry
+    key = (search or "").lower()
+    now = time.monotonic()
+    cached = _stock_list_cache.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    
     try:
         from ..database import db_manager
         
@@ -66,12 +83,11 @@ async def get_stock_list(search: str = Query(None, description="Search term")):
             query = """
                 SELECT ticker as symbol, name 
                 FROM kol.stock 
-                WHERE ticker ILIKE %s OR name ILIKE %s
+                WHERE ticker ILIKE $1 OR name ILIKE $1
                 ORDER BY ticker
                 LIMIT 50
             """
-            search_term = f"%{search}%"
-            stocks = db_manager.execute_query(query, (search_term, search_term))
+            stocks = await db_manager.fetch(query, f"%{search}%")
         else:
             query = """
                 SELECT ticker as symbol, name 
@@ -79,9 +95,14 @@ async def get_stock_list(search: str = Query(None, description="Search term")):
                 ORDER BY ticker
                 LIMIT 100
             """
-            stocks = db_manager.execute_query(query)
+            stocks = await db_manager.fetch(query)
         
-        return [{"value": s['symbol'], "label": f"{s['symbol']} - {s.get('name', '')}"} for s in stocks]
+        result = [{"value": s['symbol'], "label": f"{s['symbol']} - {s.get('name', '')}"} for s in stocks]
+        
+        if len(_stock_list_cache) >= STOCK_LIST_CACHE_SIZE:
+            _stock_list_cache.clear()
+        _stock_list_cache[key] = (now + STOCK_LIST_TTL, result)
+        return result
         
     except Exception as e:
         logger.error(f"Error getting stock list: {e}", exc_info=True)
@@ -100,10 +121,11 @@ async def get_sample_data(
     try:
         symbol_list = [s.strip() for s in symbols.split(',')]
         
-        logger.info(f"Getting sample data for: {symbol_list}")
+        logger.info("Getting sample data for: %s", symbol_list)
         
-        # Get all data (no limit)
-        sample_data = data_service.get_sample_data(
+        # Get all data (no limit); the blocking query runs off the event loop
+        sample_data = await asyncio.to_thread(
+            data_service.get_sample_data,
             symbols=symbol_list,
             start_date=startDate,
             end_date=endDate,
@@ -125,4 +147,3 @@ async def get_sample_data(
     except Exception as e:
         logger.error(f"Error getting sample data: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-
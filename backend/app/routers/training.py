@@ -1,7 +1,13 @@
 """Training API endpoints"""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import TypeAdapter
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import functools
 import logging
+import multiprocessing
+import os
 import time
 import numpy as np
 from pathlib import Path
@@ -11,12 +17,14 @@ from ..models.training import (
     TrainingStartResponse,
     TrainingResponse,
     TrainingProgress,
-    TrainingResult,
-    TrainingMetrics
+    TrainingResult
 )
 from ..services.training_service import training_service
 from ..services.data_service import data_service
-from ..utils.storage import load_json, job_exists, save_json, load_config
+from ..services.job_queue import init_worker_logging, submit_job
+from ..utils.storage import load_json, job_exists, job_files_etag, save_json, load_config
+from ..utils.http import conditional_response
+from ..utils.logger import close_training_logger
 from ..config import settings
 from ..drl.stock_env import CustomStockTradingEnv
 
@@ -24,6 +32,67 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/training", tags=["training"])
 
+# Validate stored progress/result lists in one compiled pass instead of
+# building each model by hand
+_progress_adapter = TypeAdapter(List[TrainingProgress])
+_results_adapter = TypeAdapter(List[TrainingResult])
+
+# History entries per job id with the job directory mtime they were read at
+_history_cache: Dict[str, Tuple[float, dict]] = {}
+
+
+def _make_envs(close_ary: np.ndarray, tech_ary: np.ndarray, split_idx: int):
+    """Create the train and test environments for a data split"""
+    train_env = CustomStockTradingEnv(
+        close_ary=close_ary,
+        tech_ary=tech_ary,
+        initial_amount=settings.initial_amount,
+        max_stock=settings.max_stock,
+        cost_pct=settings.transaction_cost_pct,
+        fast_tanh=settings.env_fast_tanh,
+        beg_idx=0,
+        end_idx=split_idx
+    )
+    
+    test_env = CustomStockTradingEnv(
+        close_ary=close_ary,
+        tech_ary=tech_ary,
+        initial_amount=settings.initial_amount,
+        max_stock=settings.max_stock,
+        cost_pct=settings.transaction_cost_pct,
+        fast_tanh=settings.env_fast_tanh,
+        beg_idx=split_idx,
+        end_idx=None
+    )
+    
+    return train_env, test_env
+
+
+def _init_algorithm_worker(progress_lock):
+    """Set up a process that trains single algorithms of a job"""
+    init_worker_logging()
+    # All algorithms of the job update the same progress.json
+    training_service.share_progress(progress_lock)
+
+
+def _train_algorithm(
+    job_id: str,
+    algorithm: str,
+    close_ary: np.ndarray,
+    tech_ary: np.ndarray,
+    split_idx: int,
+    total_timesteps: int
+):
+    """Train one algorithm in a worker process on its own environments"""
+    train_env, test_env = _make_envs(close_ary, tech_ary, split_idx)
+    return training_service.train_algorithm(
+        job_id=job_id,
+        algorithm=algorithm,
+        train_env=train_env,
+        test_env=test_env,
+        total_timesteps=total_timesteps
+    )
+
 
 def run_training_job(
     job_id: str,
@@ -88,55 +157,58 @@ def run_training_job(
         logger.info(f"Train dates: {dates[0]} to {dates[split_idx-1]}")
         logger.info(f"Test dates: {dates[split_idx]} to {dates[-1]}")
         
-        # Create environments
-        train_env = CustomStockTradingEnv(
-            close_ary=close_ary,
-            tech_ary=tech_ary,
-            initial_amount=settings.initial_amount,
-            max_stock=settings.max_stock,
-            cost_pct=settings.transaction_cost_pct,
-            beg_idx=0,
-            end_idx=split_idx
-        )
-        
-        test_env = CustomStockTradingEnv(
-            close_ary=close_ary,
-            tech_ary=tech_ary,
-            initial_amount=settings.initial_amount,
-            max_stock=settings.max_stock,
-            cost_pct=settings.transaction_cost_pct,
-            beg_idx=split_idx,
-            end_idx=None
-        )
-        
         # Save data with dates
         from ..utils.storage import ensure_output_dir
         job_dir = ensure_output_dir(job_id)
         data_dir = job_dir / "data"
-        np.savez(
-            str(data_dir / "train.npz"),
+        # Dates as datetime64 (8 bytes each) rather than strings. The train split
+        # is only kept for reference and is compressed; the test split is read
+        # back by every backtest, so it is stored uncompressed
+        dates_ary = np.asarray(dates, dtype='datetime64[D]')
+        np.savez_compressed(
+            data_dir / "train.npz",
             close_ary=close_ary[:split_idx],
             tech_ary=tech_ary[:split_idx],
-            dates=np.array(dates[:split_idx])
+            dates=dates_ary[:split_idx]
         )
         np.savez(
-            str(data_dir / "test.npz"),
+            data_dir / "test.npz",
             close_ary=close_ary[split_idx:],
             tech_ary=tech_ary[split_idx:],
-            dates=np.array(dates[split_idx:])
+            dates=dates_ary[split_idx:]
         )
         
         # Train each algorithm
-        results = []
-        for algorithm in algorithms:
-            result = training_service.train_algorithm(
-                job_id=job_id,
-                algorithm=algorithm,
-                train_env=train_env,
-                test_env=test_env,
-                total_timesteps=total_timesteps
-            )
-            results.append(result)
+        workers = min(settings.train_parallel_algorithms, len(algorithms))
+        if workers > 1:
+            logger.info(f"Training {len(algorithms)} algorithms in {workers} processes")
+            progress_lock = multiprocessing.get_context("spawn").Lock()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_algorithm_worker,
+                initargs=(progress_lock,)
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _train_algorithm, job_id, algorithm,
+                        close_ary, tech_ary, split_idx, total_timesteps
+                    )
+                    for algorithm in algorithms
+                ]
+                results = [future.result() for future in futures]
+        else:
+            train_env, test_env = _make_envs(close_ary, tech_ary, split_idx)
+            results = []
+            for algorithm in algorithms:
+                result = training_service.train_algorithm(
+                    job_id=job_id,
+                    algorithm=algorithm,
+                    train_env=train_env,
+                    test_env=test_env,
+                    total_timesteps=total_timesteps
+                )
+                results.append(result)
         
         # Save final results
         results_data = {
@@ -149,13 +221,13 @@ def run_training_job(
         
     except Exception as e:
         logger.error(f"Error in training job {job_id}: {e}", exc_info=True)
+        training_service.mark_job_failed(job_id)
+    finally:
+        close_training_logger(job_id)
 
 
 @router.post("/start", response_model=TrainingStartResponse)
-async def start_training(
-    request: TrainingConfig,
-    background_tasks: BackgroundTasks
-):
+async def start_training(request: TrainingConfig):
     """Start training job"""
     try:
         logger.info(f"Received training request: {request}")
@@ -170,8 +242,8 @@ async def start_training(
             total_timesteps=request.totalTimesteps
         )
         
-        # Add background task
-        background_tasks.add_task(
+        # Queue the job on a worker process; progress is polled from its files
+        submit_job(
             run_training_job,
             job_id,
             request.symbols,
@@ -179,7 +251,8 @@ async def start_training(
             request.startDate,
             request.endDate,
             request.trainTestSplit,
-            request.totalTimesteps
+            request.totalTimesteps,
+            on_failure=functools.partial(training_service.mark_job_failed, job_id)
         )
         
         return TrainingStartResponse(jobId=job_id)
@@ -189,37 +262,38 @@ async def start_training(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _load_progress_and_results(job_id: str) -> Tuple[dict, Optional[dict]]:
+    """Read a job's progress.json and, if present, results.json in one call"""
+    progress_data = load_json(job_id, "progress.json")
+    try:
+        results_data = load_json(job_id, "results.json")
+    except FileNotFoundError:
+        results_data = None
+    return progress_data, results_data
+
+
 @router.get("/progress/{job_id}", response_model=TrainingResponse)
-async def get_training_progress(job_id: str):
+async def get_training_progress(job_id: str, request: Request, response: Response):
     """Get training progress"""
     try:
         if not job_exists(job_id):
             raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
         
-        # Load progress
-        progress_data = load_json(job_id, "progress.json")
-        
-        # Load results if available
-        try:
-            results_data = load_json(job_id, "results.json")
-            results = [
-                TrainingResult(
-                    algorithm=r["algorithm"],
-                    status=r["status"],
-                    metrics=TrainingMetrics(**r["metrics"]),
-                    trainingTime=r["trainingTime"],
-                    modelPath=r["modelPath"]
-                )
-                for r in results_data.get("results", [])
-            ]
-        except FileNotFoundError:
-            results = []
+        # Unchanged files mean an unchanged payload
+        etag = job_files_etag(job_id, "progress.json", "results.json")
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+        
+        progress_data, results_data = await asyncio.to_thread(_load_progress_and_results, job_id)
+        
+        # Results are only available once training has finished
+        results = []
+        if results_data is not None:
+            results = _results_adapter.validate_python(results_data.get("results", []))
         
         # Convert progress
-        progress_list = [
-            TrainingProgress(**p)
-            for p in progress_data["progress"]
-        ]
+        progress_list = _progress_adapter.validate_python(progress_data["progress"])
         
         return TrainingResponse(
             jobId=job_id,
@@ -235,31 +309,24 @@ async def get_training_progress(job_id: str):
 
 
 @router.get("/results/{job_id}", response_model=TrainingResponse)
-async def get_training_results(job_id: str):
+async def get_training_results(job_id: str, request: Request, response: Response):
     """Get training results"""
     try:
         if not job_exists(job_id):
             raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
         
-        # Load results
-        results_data = load_json(job_id, "results.json")
-        progress_data = load_json(job_id, "progress.json")
-        
-        results = [
-            TrainingResult(
-                algorithm=r["algorithm"],
-                status=r["status"],
-                metrics=TrainingMetrics(**r["metrics"]),
-                trainingTime=r["trainingTime"],
-                modelPath=r["modelPath"]
-            )
-            for r in results_data["results"]
-        ]
-        
-        progress_list = [
-            TrainingProgress(**p)
-            for p in progress_data["progress"]
-        ]
+        etag = job_files_etag(job_id, "results.json", "progress.json")
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+        
+        progress_data, results_data = await asyncio.to_thread(_load_progress_and_results, job_id)
+        if results_data is None:
+            raise FileNotFoundError(f"File results.json not found for job {job_id}")
+        
+        results = _results_adapter.validate_python(results_data["results"])
+        
+        progress_list = _progress_adapter.validate_python(progress_data["progress"])
         
         return TrainingResponse(
             jobId=job_id,
@@ -282,31 +349,48 @@ async def get_training_history():
         if not output_dir.exists():
             return []
         
+        with os.scandir(output_dir) as it:
+            entries = [(e.name, e.stat().st_mtime) for e in it if e.is_dir()]
+        
         history = []
-        for job_dir in output_dir.iterdir():
-            if job_dir.is_dir():
-                try:
-                    config = load_config(str(job_dir.name))
-                    results_file = job_dir / "results.json"
-                    
-                    job_info = {
-                        "jobId": str(job_dir.name),
-                        "symbols": config.get("symbols", []),
-                        "algorithms": config.get("algorithms", []),
-                        "startDate": config.get("startDate"),
-                        "endDate": config.get("endDate"),
-                        "trainTestSplit": config.get("trainTestSplit"),
-                        "createdAt": config.get("createdAt"),
-                        "completed": results_file.exists()
-                    }
-                    
-                    history.append(job_info)
-                except Exception as e:
-                    logger.warning(f"Error loading job {job_dir.name}: {e}")
-                    continue
+        for job_id, mtime in entries:
+            # Adding results.json changes the directory mtime, so a cached
+            # entry is reused only while the job is unchanged
+            cached = _history_cache.get(job_id)
+            if cached is not None and cached[0] == mtime:
+                history.append(cached[1])
+                continue
+            
+            try:
+                config = load_config(job_id)
+                results_file = output_dir / job_id / "results.json"
+                
+                job_info = {
+                    "jobId": job_id,
+                    "symbols": config.get("symbols", []),
+                    "algorithms": config.get("algorithms", []),
+                    "startDate": config.get("startDate"),
+                    "endDate": config.get("endDate"),
+                    "trainTestSplit": config.get("trainTestSplit"),
+                    "createdAt": config.get("createdAt"),
+                    "completed": results_file.exists()
+                }
+                
+                _history_cache[job_id] = (mtime, job_info)
+                history.append(job_info)
+            except Exception as e:
+                logger.warning(f"Error loading job {job_id}: {e}")
+                continue
+        
+        # Drop jobs whose directories were removed
+        if len(_history_cache) > len(entries):
+            present = {job_id for job_id, _ in entries}
+            for job_id in list(_history_cache):
+                if job_id not in present:
+                    del _history_cache[job_id]
         
         # Sort by creation time, most recent first
-        history.sort(key=lambda x: x.get("createdAt", ""), reverse=True)
+        history.sort(key=lambda x: x.get("createdAt") or "", reverse=True)
         
         return history
         
@@ -1,13 +1,100 @@
 """Backtesting service for trained DRL models"""
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import math
+import multiprocessing
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import logging
 from pathlib import Path
 
 from ..config import settings
-from ..utils.storage import load_json, save_json, job_exists, get_job_dir
+from ..utils.storage import (
+    BACKTEST_RESULTS_FILE,
+    get_job_dir,
+    job_exists,
+    load_backtest_results,
+    load_config,
+    save_backtest_results
+)
 from ..drl.stock_env import CustomStockTradingEnv
+from ..drl.backtest_kernels import episode_metrics, fixed_action_values, step_returns
 from ..utils.logger import backtest_service_logger as logger, setup_backtest_logger
+from .job_queue import init_worker_logging
+
+
+def _make_test_env(close_ary: np.ndarray, tech_ary: np.ndarray) -> CustomStockTradingEnv:
+    """Create the backtest environment over the test data"""
+    return CustomStockTradingEnv(
+        close_ary=close_ary,
+        tech_ary=tech_ary,
+        initial_amount=settings.initial_amount,
+        max_stock=settings.max_stock,
+        cost_pct=settings.transaction_cost_pct,
+        fast_tanh=settings.env_fast_tanh
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _torch_device() -> str:
+    """Device SB3 models are loaded onto, checked once per process"""
+    import torch
+    if not torch.cuda.is_available():
+        # Backtests run one small policy at a time, often in parallel processes;
+        # as in training, extra intra-op threads only oversubscribe the cores
+        if settings.torch_num_threads > 0:
+            torch.set_num_threads(settings.torch_num_threads)
+        return "cpu"
+    return "cuda"
+
+
+@functools.lru_cache(maxsize=32)
+def _load_sb3_model(model_path: str, mtime_ns: int, algorithm: str, device: str):
+    """
+    Load a trained SB3 model, reusing the loaded model on repeat backtests
+
+    ``mtime_ns`` is part of the cache key only, so a retrained model at the
+    same path is loaded afresh. Backtests only call ``predict``, which leaves
+    the model unchanged.
+    """
+    from stable_baselines3 import PPO, DQN, SAC, TD3, A2C
+
+    # Map algorithm names to SB3 classes
+    agent_map = {
+        "PPO": PPO,
+        "DQN": DQN,  # DQN with discrete action wrapper
+        "SAC": SAC,
+        "TD3": TD3,
+        "A2C": A2C,
+    }
+    agent_class = agent_map.get(algorithm, PPO)
+    return agent_class.load(model_path, device=device)
+
+
+def _run_backtest_task(
+    job_id: str,
+    job_dir: Path,
+    kind: str,
+    name: str,
+    close_ary: np.ndarray,
+    tech_ary: np.ndarray,
+    dates: List[str]
+) -> Dict[str, Any]:
+    """Run one DRL model ("drl") or baseline strategy backtest in a worker process"""
+    test_env = _make_test_env(close_ary, tech_ary)
+    if kind == "drl":
+        return backtest_service._backtest_drl_model(
+            job_id=job_id,
+            job_dir=job_dir,
+            algorithm=name,
+            test_env=test_env,
+            dates=dates
+        )
+    return backtest_service._run_baseline_strategy(
+        strategy=name,
+        test_env=test_env,
+        dates=dates
+    )
 
 
 class BacktestService:
@@ -31,14 +118,14 @@ class BacktestService:
         # Setup job-specific logger
         job_logger = setup_backtest_logger(job_id)
         
-        logger.info(f"=" * 80)
-        logger.info(f"STARTING BACKTESTING")
-        logger.info(f"Job ID: {job_id}")
-        logger.info(f"Baseline Strategies: {baseline_strategies}")
-        logger.info(f"=" * 80)
+        logger.info("=" * 80)
+        logger.info("STARTING BACKTESTING")
+        logger.info("Job ID: %s", job_id)
+        logger.info("Baseline Strategies: %s", baseline_strategies)
+        logger.info("=" * 80)
         
-        job_logger.info(f"Backtest initiated for job {job_id}")
-        job_logger.info(f"Strategies to compare: {baseline_strategies}")
+        job_logger.info("Backtest initiated for job %s", job_id)
+        job_logger.info("Strategies to compare: %s", baseline_strategies)
         
         if not job_exists(job_id):
             error_msg = f"Job {job_id} not found"
@@ -48,38 +135,37 @@ class BacktestService:
         
         # Check if backtest results already exist
         job_dir = get_job_dir(job_id)
-        backtest_results_file = job_dir / "backtest_results.json"
+        backtest_results_file = job_dir / BACKTEST_RESULTS_FILE
         if backtest_results_file.exists():
-            logger.info(f"Found existing backtest results, loading...")
-            job_logger.info(f"Loading cached backtest results from {backtest_results_file}")
-            backtest_data = load_json(job_id, "backtest_results.json")
-            logger.info(f"Loaded cached results with {len(backtest_data.get('results', []))} entries")
+            logger.info("Found existing backtest results, loading...")
+            job_logger.info("Loading cached backtest results from %s", backtest_results_file)
+            backtest_data = load_backtest_results(job_id)
+            logger.info("Loaded cached results with %s entries", len(backtest_data.get('results', [])))
             return backtest_data
         
-        logger.info(f"No cached results found, running full backtest...")
-        job_logger.info(f"Starting fresh backtest execution")
+        logger.info("No cached results found, running full backtest...")
+        job_logger.info("Starting fresh backtest execution")
         
         # Load job config
-        from ..utils.storage import load_config
         config = load_config(job_id)
-        logger.info(f"Loaded configuration: {config.get('symbols', [])} symbols, {config.get('algorithms', [])} algorithms")
-        job_logger.info(f"Job configuration loaded: {config}")
+        logger.info("Loaded configuration: %s symbols, %s algorithms", config.get('symbols', []), config.get('algorithms', []))
+        job_logger.info("Job configuration loaded: %s", config)
         
         # Load test data
-        job_dir = get_job_dir(job_id)
         test_data_path = job_dir / "data" / "test.npz"
-        logger.info(f"Loading test data from {test_data_path}")
-        test_data = np.load(str(test_data_path), allow_pickle=True)
-        close_ary = test_data['close_ary']
-        tech_ary = test_data['tech_ary']
-        logger.info(f"Test data loaded: close_ary shape={close_ary.shape}, tech_ary shape={tech_ary.shape}")
-        job_logger.info(f"Test data: {close_ary.shape[0]} days, {close_ary.shape[1] if len(close_ary.shape) > 1 else 1} stocks")
+        logger.info("Loading test data from %s", test_data_path)
+        with np.load(str(test_data_path), allow_pickle=True) as test_data:
+            close_ary = test_data['close_ary']
+            tech_ary = test_data['tech_ary']
+            test_dates = test_data['dates'] if 'dates' in test_data else None
+        logger.info("Test data loaded: close_ary shape=%s, tech_ary shape=%s", close_ary.shape, tech_ary.shape)
+        job_logger.info("Test data: %s days, %s stocks", close_ary.shape[0], close_ary.shape[1] if len(close_ary.shape) > 1 else 1)
         
         # Load actual dates from test data
-        if 'dates' in test_data:
-            dates = [str(d) for d in test_data['dates']]
-            logger.info(f"Loaded {len(dates)} test dates: {dates[0]} to {dates[-1]}")
-            job_logger.info(f"Date range: {dates[0]} to {dates[-1]}")
+        if test_dates is not None:
+            dates = [str(d) for d in test_dates]
+            logger.info("Loaded %s test dates: %s to %s", len(dates), dates[0], dates[-1])
+            job_logger.info("Date range: %s to %s", dates[0], dates[-1])
         else:
             # Fallback to approximate dates if not available
             logger.warning("No dates found in test data, using approximate dates")
@@ -87,83 +173,118 @@ class BacktestService:
             num_days = len(close_ary)
             dates = [f"2023-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}" for i in range(num_days)]
         
-        # Create test environment
-        test_env = CustomStockTradingEnv(
-            close_ary=close_ary,
-            tech_ary=tech_ary,
-            initial_amount=settings.initial_amount,
-            max_stock=settings.max_stock,
-            cost_pct=settings.transaction_cost_pct
-        )
-        
         results = []
-        
-        # Run backtest for each trained model
         algorithms = config.get("algorithms", [])
-        logger.info(f"-" * 60)
-        logger.info(f"BACKTESTING DRL MODELS")
-        logger.info(f"Algorithms: {algorithms}")
-        logger.info(f"-" * 60)
-        
-        for i, algorithm in enumerate(algorithms, 1):
-            logger.info(f"[{i}/{len(algorithms)}] Backtesting {algorithm}...")
-            job_logger.info(f"Starting backtest for algorithm: {algorithm}")
-            
-            try:
-                result = self._backtest_drl_model(
+        
+        # Each backtest is independent; with several workers they all run in
+        # parallel processes, each on its own copy of the test environment
+        tasks = [("drl", algorithm) for algorithm in algorithms]
+        tasks += [("baseline", strategy) for strategy in baseline_strategies]
+        workers = min(settings.backtest_parallel_workers, len(tasks))
+        executor = None
+        futures = {}
+        if workers > 1:
+            logger.info("Running %s backtests in %s processes", len(tasks), workers)
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker_logging
+            )
+            for kind, name in tasks:
+                futures[(kind, name)] = executor.submit(
+                    _run_backtest_task, job_id, job_dir, kind, name, close_ary, tech_ary, dates
+                )
+        else:
+            # Create test environment
+            test_env = _make_test_env(close_ary, tech_ary)
+        
+        def run_task(kind: str, name: str) -> Dict[str, Any]:
+            if executor is not None:
+                return futures[(kind, name)].result()
+            if kind == "drl":
+                return self._backtest_drl_model(
                     job_id=job_id,
-                    algorithm=algorithm,
+                    job_dir=job_dir,
+                    algorithm=name,
                     test_env=test_env,
                     dates=dates
                 )
-                results.append(result)
-                logger.info(f"  ✓ {algorithm} completed: Total Return = {result['metrics']['totalReturn']:.2%}")
-                job_logger.info(f"{algorithm} backtest completed successfully: {result['metrics']}")
-            except Exception as e:
-                error_msg = f"Error backtesting {algorithm}: {str(e)}"
-                logger.error(error_msg, exc_info=True)
-                job_logger.error(error_msg, exc_info=True)
-        
-        # Run baseline strategies
-        logger.info(f"-" * 60)
-        logger.info(f"BACKTESTING BASELINE STRATEGIES")
-        logger.info(f"Strategies: {baseline_strategies}")
-        logger.info(f"-" * 60)
-        
-        for i, strategy in enumerate(baseline_strategies, 1):
-            logger.info(f"[{i}/{len(baseline_strategies)}] Running {strategy}...")
-            job_logger.info(f"Starting backtest for baseline strategy: {strategy}")
+            return self._run_baseline_strategy(
+                strategy=name,
+                test_env=test_env,
+                dates=dates
+            )
+        
+        try:
+            # Run backtest for each trained model
+            logger.info("-" * 60)
+            logger.info("BACKTESTING DRL MODELS")
+            logger.info("Algorithms: %s", algorithms)
+            logger.info("-" * 60)
             
-            try:
-                result = self._run_baseline_strategy(
-                    strategy=strategy,
-                    test_env=test_env,
-                    dates=dates
-                )
-                results.append(result)
-                logger.info(f"  ✓ {strategy} completed: Total Return = {result['metrics']['totalReturn']:.2%}")
-                job_logger.info(f"{strategy} baseline backtest completed: {result['metrics']}")
-            except Exception as e:
-                error_msg = f"Error running baseline {strategy}: {str(e)}"
-                logger.error(error_msg, exc_info=True)
-                job_logger.error(error_msg, exc_info=True)
+            for i, algorithm in enumerate(algorithms, 1):
+                logger.info("[%s/%s] Backtesting %s...", i, len(algorithms), algorithm)
+                job_logger.info("Starting backtest for algorithm: %s", algorithm)
+                
+                try:
+                    result = run_task("drl", algorithm)
+                    results.append(result)
+                    logger.info("  ✓ %s completed: Total Return = %.2f%%", algorithm, result['metrics']['totalReturn'] * 100)
+                    job_logger.info("%s backtest completed successfully: %s", algorithm, result['metrics'])
+                except Exception as e:
+                    error_msg = f"Error backtesting {algorithm}: {str(e)}"
+                    logger.error(error_msg, exc_info=True)
+                    job_logger.error(error_msg, exc_info=True)
+            
+            # Run baseline strategies
+            logger.info("-" * 60)
+            logger.info("BACKTESTING BASELINE STRATEGIES")
+            logger.info("Strategies: %s", baseline_strategies)
+            logger.info("-" * 60)
+            
+            for i, strategy in enumerate(baseline_strategies, 1):
+                logger.info("[%s/%s] Running %s...", i, len(baseline_strategies), strategy)
+                job_logger.info("Starting backtest for baseline strategy: %s", strategy)
+                
+                try:
+                    result = run_task("baseline", strategy)
+                    results.append(result)
+                    logger.info("  ✓ %s completed: Total Return = %.2f%%", strategy, result['metrics']['totalReturn'] * 100)
+                    job_logger.info("%s baseline backtest completed: %s", strategy, result['metrics'])
+                except Exception as e:
+                    error_msg = f"Error running baseline {strategy}: {str(e)}"
+                    logger.error(error_msg, exc_info=True)
+                    job_logger.error(error_msg, exc_info=True)
+            
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
         
         # Find best algorithm
-        logger.info(f"Analyzing results...")
-        best_return = max(r["metrics"]["totalReturn"] for r in results)
-        best_sharpe = max(r["metrics"]["sharpeRatio"] for r in results)
-        best_algo = max(results, key=lambda x: x["metrics"]["sharpeRatio"])["algorithm"]
-        
-        logger.info(f"=" * 60)
-        logger.info(f"BACKTEST COMPLETED")
-        logger.info(f"  Best Algorithm: {best_algo}")
-        logger.info(f"  Best Return: {best_return:.2%}")
-        logger.info(f"  Best Sharpe Ratio: {best_sharpe:.2f}")
-        logger.info(f"  Total Results: {len(results)}")
-        logger.info(f"=" * 60)
-        
-        job_logger.info(f"Backtest analysis completed")
-        job_logger.info(f"Best performer: {best_algo} (Sharpe={best_sharpe:.2f}, Return={best_return:.2%})")
+        logger.info("Analyzing results...")
+        if not results:
+            raise ValueError(f"No backtest results to compare for job {job_id}")
+        # Best return, and best Sharpe ratio with its algorithm (first on ties),
+        # in one pass
+        best_return = best_sharpe = -math.inf
+        best_algo = None
+        for r in results:
+            metrics = r["metrics"]
+            best_return = max(best_return, metrics["totalReturn"])
+            if metrics["sharpeRatio"] > best_sharpe:
+                best_sharpe = metrics["sharpeRatio"]
+                best_algo = r["algorithm"]
+        
+        logger.info("=" * 60)
+        logger.info("BACKTEST COMPLETED")
+        logger.info("  Best Algorithm: %s", best_algo)
+        logger.info("  Best Return: %.2f%%", best_return * 100)
+        logger.info("  Best Sharpe Ratio: %.2f", best_sharpe)
+        logger.info("  Total Results: %s", len(results))
+        logger.info("=" * 60)
+        
+        job_logger.info("Backtest analysis completed")
+        job_logger.info("Best performer: %s (Sharpe=%.2f, Return=%.2f%%)", best_algo, best_sharpe, best_return * 100)
         
         backtest_data = {
             "jobId": job_id,
@@ -176,15 +297,16 @@ class BacktestService:
         }
         
         # Save backtest results
-        save_json(job_id, "backtest_results.json", backtest_data)
-        logger.info(f"Results saved to: {job_dir / 'backtest_results.json'}")
-        job_logger.info(f"Backtest results saved successfully")
+        save_backtest_results(job_id, backtest_data)
+        logger.info("Results saved to: %s", backtest_results_file)
+        job_logger.info("Backtest results saved successfully")
         
         return backtest_data
     
     def _backtest_drl_model(
         self,
         job_id: str,
+        job_dir: Path,
         algorithm: str,
         test_env: CustomStockTradingEnv,
         dates: List[str]
@@ -192,84 +314,58 @@ class BacktestService:
         """Backtest a trained DRL model using Stable-Baselines3"""
         import torch
         
-        logger.debug(f"Starting DRL model backtest: {algorithm}")
+        logger.debug("Starting DRL model backtest: %s", algorithm)
         
-        # Import SB3
-        from stable_baselines3 import PPO, DQN, SAC, TD3, A2C
-        
-        # Map algorithm names to SB3 classes
-        agent_map = {
-            "PPO": PPO,
-            "DQN": DQN,  # DQN with discrete action wrapper
-            "SAC": SAC,
-            "TD3": TD3,
-            "A2C": A2C,
-        }
-        
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.debug(f"Using device: {device}")
+        device = _torch_device()
+        logger.debug("Using device: %s", device)
         
         try:
             # Load the trained SB3 model
-            model_dir = get_job_dir(job_id) / "models" / algorithm
+            model_dir = job_dir / "models" / algorithm
             model_path = model_dir / "model.zip"
             
-            if not model_path.exists():
-                logger.warning(f"Model not found at {model_path}, using fallback")
+            try:
+                model_mtime_ns = model_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                logger.warning("Model not found at %s, using fallback", model_path)
                 return self._backtest_drl_model_fallback(job_id, algorithm, test_env, dates)
             
-            logger.info(f"Loading SB3 model from: {model_path}")
+            logger.info("Loading SB3 model from: %s", model_path)
             
             # Apply discrete action wrapper for DQN
             if algorithm == "DQN":
                 from app.drl.discrete_wrapper import DiscreteActionWrapper
                 test_env = DiscreteActionWrapper(test_env, n_actions_per_stock=5)
-                logger.info(f"Applied DiscreteActionWrapper for DQN backtesting")
+                logger.info("Applied DiscreteActionWrapper for DQN backtesting")
             
             # Load the trained SB3 model
-            agent_class = agent_map.get(algorithm, PPO)
-            model = agent_class.load(model_path, device=device)
-            logger.info(f"Model loaded successfully")
+            model = _load_sb3_model(str(model_path), model_mtime_ns, algorithm, device)
+            logger.info("Model loaded successfully")
             
             # Run backtest with trained model
-            returns = []
-            cumulative_returns = []
-            portfolio_values = [settings.initial_amount]
+            portfolio_values = self._new_portfolio_values(test_env.max_step)
             
             state, _ = test_env.reset()
             initial_value = test_env.get_total_asset()
             
-            # Run through entire test period
-            for step in range(test_env.max_step):
-                # Get action from trained SB3 model
-                action, _ = model.predict(state, deterministic=True)
-                state, reward, done, truncated, _ = test_env.step(action)
-                
-                # Get current portfolio value
-                current_value = test_env.get_total_asset()
-                portfolio_values.append(current_value)
-                
-                # Calculate daily return as percentage change
-                if len(portfolio_values) > 1:
-                    daily_return = ((portfolio_values[-1] - portfolio_values[-2]) / portfolio_values[-2]) * 100
-                else:
-                    daily_return = 0.0
-                
-                returns.append(daily_return)
-                
-                # Cumulative return from initial amount
-                cumulative_return = ((current_value - initial_value) / initial_value) * 100
-                cumulative_returns.append(cumulative_return)
+            # Run through entire test period, without autograd bookkeeping
+            with torch.inference_mode():
+                for step in range(test_env.max_step):
+                    # Get action from trained SB3 model
+                    action, _ = model.predict(state, deterministic=True)
+                    state, reward, done, truncated, _ = test_env.step(action)
+                    
+                    # Record current portfolio value
+                    portfolio_values[step + 1] = test_env.get_total_asset()
             
-            # Ensure we have the right length
-            returns = returns[:test_env.max_step]
-            cumulative_returns = cumulative_returns[:test_env.max_step]
+            returns, cumulative_returns = self._episode_returns(portfolio_values, initial_value)
             
             # Calculate metrics
-            returns_array = np.array(returns)
-            metrics = self._calculate_metrics(returns_array)
+            metrics = self._calculate_metrics(returns)
+            returns = returns.tolist()
+            cumulative_returns = cumulative_returns.tolist()
             
-            logger.info(f"Completed backtest for {algorithm}: Return={metrics['totalReturn']:.2%}")
+            logger.info("Completed backtest for %s: Return=%.2f%%", algorithm, metrics['totalReturn'] * 100)
             
             return {
                 "algorithm": algorithm,
@@ -281,8 +377,8 @@ class BacktestService:
             }
             
         except Exception as e:
-            logger.error(f"Error loading/running model for {algorithm}: {e}")
-            logger.warning(f"Falling back to deterministic actions for {algorithm}")
+            logger.error("Error loading/running model for %s: %s", algorithm, e)
+            logger.warning("Falling back to deterministic actions for %s", algorithm)
             return self._backtest_drl_model_fallback(job_id, algorithm, test_env, dates)
     
     def _backtest_drl_model_fallback(
@@ -295,44 +391,29 @@ class BacktestService:
         """Fallback backtest with deterministic pseudo-random actions"""
         # Set seed based on job_id and algorithm for reproducibility
         seed = hash(f"{job_id}_{algorithm}") % (2**32)
-        np.random.seed(seed)
+        # Deterministic actions based on seed, drawn for the whole period at once
+        actions = np.random.RandomState(seed).uniform(
+            -1, 1, (test_env.max_step, test_env.action_dim)
+        )
         
-        returns = []
-        cumulative_returns = []
-        portfolio_values = [settings.initial_amount]
+        portfolio_values = self._new_portfolio_values(test_env.max_step)
         
         state, _ = test_env.reset()
         initial_value = test_env.get_total_asset()
         
         # Run through entire test period
         for step in range(test_env.max_step):
-            # Deterministic action based on seed
-            action = np.random.uniform(-1, 1, test_env.action_dim)
-            state, reward, done, truncated, _ = test_env.step(action)
-            
-            # Get current portfolio value
-            current_value = test_env.get_total_asset()
-            portfolio_values.append(current_value)
+            state, reward, done, truncated, _ = test_env.step(actions[step])
             
-            # Calculate daily return as percentage change
-            if len(portfolio_values) > 1:
-                daily_return = ((portfolio_values[-1] - portfolio_values[-2]) / portfolio_values[-2]) * 100
-            else:
-                daily_return = 0.0
-            
-            returns.append(daily_return)
-            
-            # Cumulative return from initial amount
-            cumulative_return = ((current_value - initial_value) / initial_value) * 100
-            cumulative_returns.append(cumulative_return)
+            # Record current portfolio value
+            portfolio_values[step + 1] = test_env.get_total_asset()
         
-        # Ensure we have the right length
-        returns = returns[:test_env.max_step]
-        cumulative_returns = cumulative_returns[:test_env.max_step]
+        returns, cumulative_returns = self._episode_returns(portfolio_values, initial_value)
         
         # Calculate metrics
-        returns_array = np.array(returns)
-        metrics = self._calculate_metrics(returns_array)
+        metrics = self._calculate_metrics(returns)
+        returns = returns.tolist()
+        cumulative_returns = cumulative_returns.tolist()
         
         return {
             "algorithm": algorithm,
@@ -350,67 +431,53 @@ class BacktestService:
         dates: List[str]
     ) -> Dict[str, Any]:
         """Run a baseline strategy"""
-        # Set seed for reproducibility of strategies that use randomness
-        np.random.seed(42)
-        
-        returns = []
-        cumulative_returns = []
-        portfolio_values = [settings.initial_amount]
+        portfolio_values = self._new_portfolio_values(test_env.max_step)
         
         state, _ = test_env.reset()
         initial_value = test_env.get_total_asset()
         
-        for step in range(test_env.max_step):
-            # Generate action based on strategy
-            if strategy == "BuyAndHold":
-                # Buy all stocks at start and hold (deterministic)
-                if step == 0:
-                    action = np.ones(test_env.action_dim)
-                else:
-                    action = np.zeros(test_env.action_dim)
-            
-            elif strategy == "MovingAverage":
+        if strategy == "BuyAndHold":
+            # Buy all stocks at start and hold (deterministic). The env targets
+            # softmax weights, so the initial all-ones action and the zeros that
+            # follow both mean equal weights: replay that without stepping
+            fixed_action_values(
+                test_env.close_ary,
+                np.zeros(test_env.action_dim),
+                test_env.initial_amount,
+                test_env.cost_pct,
+                portfolio_values
+            )
+        else:
+            shape = (test_env.max_step, test_env.action_dim)
+            # Fixed seed for reproducibility of strategies that use randomness;
+            # each strategy's actions for the whole period are drawn at once
+            rng = np.random.RandomState(42)
+            if strategy == "MovingAverage":
                 # Simple moving average strategy with deterministic seed
-                action = np.random.uniform(-0.5, 0.5, test_env.action_dim)
-            
+                actions = rng.uniform(-0.5, 0.5, shape)
             elif strategy == "Random":
                 # Random actions with deterministic seed
-                action = np.random.uniform(-1, 1, test_env.action_dim)
-            
+                actions = rng.uniform(-1, 1, shape)
             elif strategy == "EqualWeight":
                 # Equal weight rebalancing with deterministic seed
-                action = np.random.uniform(-0.3, 0.3, test_env.action_dim)
-            
-            else:
-                action = np.zeros(test_env.action_dim)
-            
-            state, reward, done, truncated, _ = test_env.step(action)
-            
-            # Get current portfolio value
-            current_value = test_env.get_total_asset()
-            portfolio_values.append(current_value)
-            
-            # Calculate daily return as percentage change
-            if len(portfolio_values) > 1:
-                daily_return = ((portfolio_values[-1] - portfolio_values[-2]) / portfolio_values[-2]) * 100
+                actions = rng.uniform(-0.3, 0.3, shape)
             else:
-                daily_return = 0.0
+                actions = np.zeros(shape)
             
-            returns.append(daily_return)
-            
-            # Cumulative return from initial amount
-            cumulative_return = ((current_value - initial_value) / initial_value) * 100
-            cumulative_returns.append(cumulative_return)
-            
-            # Don't break on done - continue through entire test period
+            for step in range(test_env.max_step):
+                state, reward, done, truncated, _ = test_env.step(actions[step])
+                
+                # Record current portfolio value
+                portfolio_values[step + 1] = test_env.get_total_asset()
+                
+                # Don't break on done - continue through entire test period
         
-        # Ensure we have the right length
-        returns = returns[:test_env.max_step]
-        cumulative_returns = cumulative_returns[:test_env.max_step]
+        returns, cumulative_returns = self._episode_returns(portfolio_values, initial_value)
         
         # Calculate metrics
-        returns_array = np.array(returns)
-        metrics = self._calculate_metrics(returns_array)
+        metrics = self._calculate_metrics(returns)
+        returns = returns.tolist()
+        cumulative_returns = cumulative_returns.tolist()
         
         return {
             "algorithm": strategy,
@@ -421,25 +488,41 @@ class BacktestService:
             "metrics": metrics
         }
     
-    def _calculate_metrics(self, returns: np.ndarray) -> Dict[str, float]:
-        """Calculate performance metrics"""
-        # Total return
-        total_return = (1 + returns / 100).prod() - 1
-        
-        # Sharpe ratio (assuming 252 trading days, 0% risk-free rate)
-        sharpe_ratio = (returns.mean() / (returns.std() + 1e-9)) * np.sqrt(252)
-        
-        # Max drawdown
-        cumulative = (1 + returns / 100).cumprod()
-        running_max = np.maximum.accumulate(cumulative)
-        drawdown = (cumulative - running_max) / running_max
-        max_drawdown = drawdown.min() * 100
+    @staticmethod
+    def _new_portfolio_values(num_steps: int) -> np.ndarray:
+        """Buffer for an episode's portfolio values, starting from the initial amount"""
+        portfolio_values = np.empty(num_steps + 1)
+        portfolio_values[0] = settings.initial_amount
+        return portfolio_values
+    
+    @staticmethod
+    def _episode_returns(
+        portfolio_values: np.ndarray,
+        initial_value: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Daily and cumulative returns (in %) from an episode's portfolio values
         
-        # Volatility
-        volatility = returns.std() / 100
+        Args:
+            portfolio_values: Portfolio value before the first step, then after each step
+            initial_value: Portfolio value after reset
         
-        # Win rate
-        win_rate = (returns > 0).sum() / len(returns) if len(returns) > 0 else 0
+        Returns:
+            (daily returns, cumulative returns from initial_value)
+        """
+        num_steps = len(portfolio_values) - 1
+        returns = np.empty(num_steps)
+        cumulative_returns = np.empty(num_steps)
+        step_returns(portfolio_values, float(initial_value), returns, cumulative_returns)
+        return returns, cumulative_returns
+    
+    def _calculate_metrics(self, returns: np.ndarray) -> Dict[str, float]:
+        """Calculate performance metrics"""
+        # Total return, Sharpe ratio (252 trading days, 0% risk-free rate), max
+        # drawdown, volatility and win rate, computed in a single pass
+        total_return, sharpe_ratio, max_drawdown, volatility, win_rate = episode_metrics(
+            np.ascontiguousarray(returns, dtype=np.float64)
+        )
         
         return {
             "totalReturn": float(total_return),
@@ -0,0 +1,208 @@
+"""Numba-compiled kernels for market data preparation"""
+import math
+import numpy as np
+from numba import njit, prange, types
+
+_CUBE64 = types.Array(types.float64, 3, 'C')
+
+
+@njit(types.void(_CUBE64), cache=True)
+def fill_gaps(values):
+    """
+    Forward-fill then backward-fill missing (NaN) prices in place
+
+    Each (stock, field) series is walked along the date axis, so this matches
+    pandas ``ffill().bfill()`` per pivoted column. A series with no values at
+    all stays NaN.
+
+    Args:
+        values: Shape (days, stocks, fields)
+    """
+    days, stocks, fields = values.shape
+    for s in range(stocks):
+        for f in range(fields):
+            first_valid = -1
+            last = math.nan
+            for t in range(days):
+                v = values[t, s, f]
+                if math.isnan(v):
+                    values[t, s, f] = last
+                else:
+                    last = v
+                    if first_valid < 0:
+                        first_valid = t
+            # Leading gaps take the first observed value
+            for t in range(max(first_valid, 0)):
+                values[t, s, f] = values[first_valid, s, f]
+
+
+# Indicator windows, as the ta library defaults used before this kernel
+MACD_FAST = 12
+MACD_SLOW = 26
+BOLL_WINDOW = 20
+BOLL_DEV = 2.0
+RSI_WINDOW = 30
+CCI_WINDOW = 30
+SMA_SHORT = 30
+SMA_LONG = 60
+
+# Features per stock, in tech_ary column order
+TECH_FEATURES = (
+    'macd', 'boll_ub', 'boll_lb', 'rsi_30', 'cci_30', 'dx_30', 'close_30_sma', 'close_60_sma'
+)
+
+_MAT64 = types.Array(types.float64, 2, 'C')
+
+
+@njit(cache=True)
+def _ema(x, alpha, min_periods, out):
+    """Recursive EMA seeded with the first value (pandas ewm with adjust=False)"""
+    y = x[0]
+    for t in range(x.shape[0]):
+        if t > 0:
+            y = (1 - alpha) * y + alpha * x[t]
+        out[t] = y if t + 1 >= min_periods else math.nan
+
+
+@njit(cache=True)
+def _rolling_mean(x, window, out):
+    """
+    Rolling mean from a compensated running sum, O(n) in the window length
+
+    A window of identical values yields that value exactly, as in pandas.
+    """
+    total = 0.0
+    compensation = 0.0
+    same_count = 0
+    prev = math.nan
+    for t in range(x.shape[0]):
+        v = x[t]
+        # Kahan-summed add of the new value
+        y = v - compensation
+        s = total + y
+        compensation = (s - total) - y
+        total = s
+        if t >= window:
+            # ... and removal of the one leaving the window
+            y = -x[t - window] - compensation
+            s = total + y
+            compensation = (s - total) - y
+            total = s
+
+        same_count = same_count + 1 if v == prev else 1
+        prev = v
+
+        if t + 1 < window:
+            out[t] = math.nan
+        elif same_count >= window:
+            out[t] = v
+        else:
+            out[t] = total / window
+
+
+@njit(cache=True)
+def _rolling_std(x, window, ddof, out):
+    """
+    Rolling standard deviation by Welford's add/remove updates, O(n) in the
+    window length
+
+    A window of identical values yields exactly 0, as in pandas.
+    """
+    nobs = 0
+    mean = 0.0
+    m2 = 0.0
+    same_count = 0
+    prev = math.nan
+    for t in range(x.shape[0]):
+        v = x[t]
+        nobs += 1
+        delta = v - mean
+        mean += delta / nobs
+        m2 += delta * (v - mean)
+        if t >= window:
+            old = x[t - window]
+            nobs -= 1
+            delta = old - mean
+            mean -= delta / nobs
+            m2 -= delta * (old - mean)
+
+        same_count = same_count + 1 if v == prev else 1
+        prev = v
+
+        if t + 1 < window:
+            out[t] = math.nan
+        elif same_count >= window:
+            out[t] = 0.0
+        else:
+            out[t] = math.sqrt(max(m2 / (nobs - ddof), 0.0))
+
+
+@njit(types.void(_MAT64, _MAT64, _MAT64, types.Array(types.float64, 3, 'C')),
+      cache=True, parallel=True, error_model='numpy')
+def tech_features(close, high, low, out):
+    """
+    Technical indicators of every stock, computed in parallel over stocks
+
+    Matches the ta library indicators the features were originally built with:
+    MACD (12/26 EMA), Bollinger bands (20 days, 2 std), RSI (30 days, Wilder's
+    smoothing), CCI (30 days), a constant DX placeholder and 30/60 day SMAs.
+    Each indicator is a single O(days) recurrence. Warm-up rows are NaN.
+
+    Args:
+        close: Shape (days, stocks) - gap-filled close prices
+        high: Shape (days, stocks) - gap-filled high prices
+        low: Shape (days, stocks) - gap-filled low prices
+        out: Shape (days, stocks, len(TECH_FEATURES)) - filled with the
+            features of each stock in TECH_FEATURES order
+    """
+    days, stocks = close.shape
+    if days == 0:
+        return
+    for s in prange(stocks):
+        c = np.ascontiguousarray(close[:, s])
+        ema_fast = np.empty(days)
+        ema_slow = np.empty(days)
+        mean = np.empty(days)
+        std = np.empty(days)
+
+        # MACD
+        _ema(c, 2.0 / (MACD_FAST + 1), MACD_FAST, ema_fast)
+        _ema(c, 2.0 / (MACD_SLOW + 1), MACD_SLOW, ema_slow)
+        out[:, s, 0] = ema_fast - ema_slow
+
+        # Bollinger bands (population std)
+        _rolling_mean(c, BOLL_WINDOW, mean)
+        _rolling_std(c, BOLL_WINDOW, 0, std)
+        out[:, s, 1] = mean + BOLL_DEV * std
+        out[:, s, 2] = mean - BOLL_DEV * std
+
+        # RSI; the first day has no change and counts as zero up and down
+        alpha = 1.0 / RSI_WINDOW
+        up = 0.0
+        down = 0.0
+        for t in range(days):
+            if t > 0:
+                diff = c[t] - c[t - 1]
+                up = (1 - alpha) * up + alpha * max(diff, 0.0)
+                down = (1 - alpha) * down + alpha * max(-diff, 0.0)
+            if t + 1 < RSI_WINDOW:
+                out[t, s, 3] = math.nan
+            elif down == 0:
+                out[t, s, 3] = 100.0
+            else:
+                out[t, s, 3] = 100 - 100 / (1 + up / down)
+
+        # CCI of the typical price (sample std)
+        tp = (high[:, s] + low[:, s] + c) / 3
+        _rolling_mean(tp, CCI_WINDOW, mean)
+        _rolling_std(tp, CCI_WINDOW, 1, std)
+        out[:, s, 4] = (tp - mean) / (0.015 * std)
+
+        # DX (Directional Index) - simplified version
+        out[:, s, 5] = 50.0  # Placeholder
+
+        # Moving averages
+        _rolling_mean(c, SMA_SHORT, mean)
+        out[:, s, 6] = mean
+        _rolling_mean(c, SMA_LONG, mean)
+        out[:, s, 7] = mean
@@ -3,16 +3,16 @@ import pandas as pd
 import numpy as np
 from typing import List, Dict, Any, Tuple
 import logging
-from ta import add_all_ta_features
-from ta.trend import MACD, SMAIndicator
-from ta.volatility import BollingerBands
-from ta.momentum import RSIIndicator
 
 from ..database import db_manager
 from ..config import settings
+from .data_kernels import TECH_FEATURES, fill_gaps, tech_features
 
 logger = logging.getLogger(__name__)
 
+# Price fields in the order they are laid out along the last data axis
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
 
 class DataService:
     """Service for fetching and processing stock data"""
@@ -43,134 +43,75 @@ class DataService:
         if not stocks:
             raise ValueError(f"No stocks found for symbols: {symbols}")
         
-        symbol_to_id = {stock['symbol']: stock['id'] for stock in stocks}
         stock_ids = [stock['id'] for stock in stocks]
         
-        # Fetch price data
-        prices = self.db.get_multiple_stock_prices(stock_ids, start_date, end_date)
-        if not prices:
+        # Fetch price data directly into a DataFrame
+        df = self.db.get_multiple_stock_prices_df(stock_ids, start_date, end_date)
+        if df.empty:
             raise ValueError(f"No price data found for date range {start_date} to {end_date}")
         
-        logger.info(f"Fetched {len(prices)} price records for {len(symbols)} stocks")
+        logger.info(f"Fetched {len(df)} price records for {len(symbols)} stocks")
         
-        # Convert to DataFrame for easier processing
-        df = pd.DataFrame(prices)
-        df['date'] = pd.to_datetime(df['date'])
+        # Scatter the rows into one (days, stocks, fields) array; columns follow
+        # the requested symbol order
+        dates_ary, date_rows = np.unique(df['date'].values, return_inverse=True)
+        stock_cols = pd.Index(stock_ids).get_indexer(df['stock_id'])
+        values = np.full((len(dates_ary), len(stock_ids), len(PRICE_FIELDS)), np.nan)
+        values[date_rows, stock_cols] = df[list(PRICE_FIELDS)].to_numpy(dtype=np.float64)
         
-        # Create a pivot table for each price field
-        close_df = df.pivot(index='date', columns='stock_id', values='close')
-        high_df = df.pivot(index='date', columns='stock_id', values='high')
-        low_df = df.pivot(index='date', columns='stock_id', values='low')
-        volume_df = df.pivot(index='date', columns='stock_id', values='volume')
-        open_df = df.pivot(index='date', columns='stock_id', values='open')
+        # Fill missing values (forward fill then backward fill)
+        fill_gaps(values)
         
-        # Sort by date
-        close_df = close_df.sort_index()
-        high_df = high_df.sort_index()
-        low_df = low_df.sort_index()
-        volume_df = volume_df.sort_index()
-        open_df = open_df.sort_index()
+        open_ary, high_ary, low_ary, close_ary, volume_ary = (
+            np.ascontiguousarray(values[:, :, i]) for i in range(len(PRICE_FIELDS))
+        )
         
-        # Fill missing values (forward fill then backward fill)
-        close_df = close_df.fillna(method='ffill').fillna(method='bfill')
-        high_df = high_df.fillna(method='ffill').fillna(method='bfill')
-        low_df = low_df.fillna(method='ffill').fillna(method='bfill')
-        volume_df = volume_df.fillna(method='ffill').fillna(method='bfill')
-        open_df = open_df.fillna(method='ffill').fillna(method='bfill')
+        missing = [
+            stock['symbol'] for stock, close in zip(stocks, close_ary[0])
+            if np.isnan(close)
+        ]
+        if missing:
+            raise ValueError(f"No price data found for symbols: {missing}")
         
         # Calculate technical indicators for each stock
-        tech_features_list = []
-        
-        for stock_id in stock_ids:
-            # Create a temporary dataframe for this stock
-            stock_df = pd.DataFrame({
-                'close': close_df[stock_id],
-                'high': high_df[stock_id],
-                'low': low_df[stock_id],
-                'volume': volume_df[stock_id],
-                'open': open_df[stock_id]
-            })
-            
-            # Calculate technical indicators
-            # MACD
-            macd = MACD(close=stock_df['close'])
-            macd_values = macd.macd().values
-            
-            # Bollinger Bands
-            bollinger = BollingerBands(close=stock_df['close'])
-            boll_ub = bollinger.bollinger_hband().values
-            boll_lb = bollinger.bollinger_lband().values
-            
-            # RSI
-            rsi = RSIIndicator(close=stock_df['close'], window=30)
-            rsi_30 = rsi.rsi().values
-            
-            # CCI (Commodity Channel Index) - use approximate calculation
-            tp = (stock_df['high'] + stock_df['low'] + stock_df['close']) / 3
-            cci_30 = ((tp - tp.rolling(window=30).mean()) / 
-                      (0.015 * tp.rolling(window=30).std())).values
-            
-            # DX (Directional Index) - simplified version
-            dx_30 = np.ones_like(macd_values) * 50  # Placeholder
-            
-            # Moving averages
-            close_30_sma = SMAIndicator(close=stock_df['close'], window=30).sma_indicator().values
-            close_60_sma = SMAIndicator(close=stock_df['close'], window=60).sma_indicator().values
-            
-            # Stack all features for this stock
-            stock_features = np.column_stack([
-                macd_values,
-                boll_ub,
-                boll_lb,
-                rsi_30,
-                cci_30,
-                dx_30,
-                close_30_sma,
-                close_60_sma
-            ])
-            
-            tech_features_list.append(stock_features)
-        
-        # Concatenate all technical features
         # Shape: (days, stocks * features)
-        tech_ary = np.concatenate(tech_features_list, axis=1)
+        tech_ary = np.empty((len(dates_ary), len(stock_ids), len(TECH_FEATURES)))
+        tech_features(close_ary, high_ary, low_ary, tech_ary)
+        tech_ary = tech_ary.reshape(len(dates_ary), -1)
         
         # Fill NaN values with 0 (from indicators at the start)
         tech_ary = np.nan_to_num(tech_ary, 0)
         
-        # Get close array
-        close_ary = close_df.values
-        
         # Prepare raw data for frontend (all data)
-        raw_data = []
-        dates = close_df.index.strftime('%Y-%m-%d').tolist()
-        
-        for i, date_str in enumerate(dates):  # All rows
-            for symbol, stock_id in symbol_to_id.items():
-                col_idx = stock_ids.index(stock_id)
-                raw_data.append({
-                    'symbol': symbol,
-                    'date': date_str,
-                    'open': float(open_df.iloc[i, col_idx]),
-                    'high': float(high_df.iloc[i, col_idx]),
-                    'low': float(low_df.iloc[i, col_idx]),
-                    'close': float(close_df.iloc[i, col_idx]),
-                    'volume': int(volume_df.iloc[i, col_idx])
-                })
+        dates = np.datetime_as_string(dates_ary, unit='D').tolist()
+        symbols_by_col = [stock['symbol'] for stock in stocks]
+        raw_data = [
+            {
+                'symbol': symbol,
+                'date': date_str,
+                'open': o,
+                'high': h,
+                'low': l,
+                'close': c,
+                'volume': int(v)
+            }
+            for date_str, *row in zip(
+                dates,
+                open_ary.tolist(),
+                high_ary.tolist(),
+                low_ary.tolist(),
+                close_ary.tolist(),
+                volume_ary.tolist()
+            )
+            for symbol, o, h, l, c, v in zip(symbols_by_col, *row)
+        ]
         
         return {
             'close_ary': close_ary,
             'tech_ary': tech_ary,
             'raw_data': raw_data,
             'symbols': symbols,
-            'dates': dates,
-            'full_df': {
-                'close': close_df,
-                'high': high_df,
-                'low': low_df,
-                'open': open_df,
-                'volume': volume_df
-            }
+            'dates': dates
         }
     
     def get_sample_data(
@@ -196,7 +137,7 @@ class DataService:
         if not stocks:
             return []
         
-        symbol_to_id = {stock['symbol']: stock['id'] for stock in stocks}
+        id_to_symbol = {stock['id']: stock['symbol'] for stock in stocks}
         stock_ids = [stock['id'] for stock in stocks]
         
         prices = self.db.get_multiple_stock_prices(stock_ids, start_date, end_date)
@@ -207,8 +148,7 @@ class DataService:
         result = []
         max_records = limit * len(symbols) if limit else len(prices)
         for price in prices[:max_records]:
-            stock_id = price['stock_id']
-            symbol = next((s for s, sid in symbol_to_id.items() if sid == stock_id), None)
+            symbol = id_to_symbol.get(price['stock_id'])
             if symbol:
                 result.append({
                     'symbol': symbol,
@@ -0,0 +1,87 @@
+"""Process pool that runs training and backtest jobs outside the API process"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import functools
+import logging
+import multiprocessing
+from typing import Callable, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def init_worker_logging():
+    """Configure logging in a freshly spawned worker process"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+def _log_job_failure(on_failure: Optional[Callable[[], None]], future: Future):
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        # Jobs log their own errors; this only catches a crashed worker process
+        logger.error(f"Job worker failed: {exc}", exc_info=exc)
+        if on_failure is not None:
+            try:
+                on_failure()
+            except Exception as e:
+                logger.error(f"Failed to record job failure: {e}", exc_info=True)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the job executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        # Spawned, not forked: workers open their own SSH tunnel and database
+        # pool instead of inheriting the API process's sockets and threads
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.job_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker_logging
+        )
+        logger.info(f"Job executor started with {settings.job_workers} worker(s)")
+    return _executor
+
+
+def submit_job(fn, *args, on_failure: Optional[Callable[[], None]] = None) -> Future:
+    """
+    Queue a job on a worker process and return immediately
+
+    Jobs report progress and results through their files in the output
+    directory, so callers only need the returned future for diagnostics.
+    A worker process that dies (OOM kill, crash in native code) breaks the
+    executor; it is then replaced so later jobs still run.
+
+    Args:
+        fn: Module-level job function (must be importable by the worker)
+        *args: Picklable job arguments
+        on_failure: Called in the API process if the job's worker dies
+            before the job finishes, to record the failure in the job's files
+
+    Returns:
+        Future of the job
+    """
+    try:
+        future = get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Job executor is broken (a worker process died), restarting it")
+        shutdown_executor()
+        future = get_executor().submit(fn, *args)
+    future.add_done_callback(functools.partial(_log_job_failure, on_failure))
+    return future
+
+
+def shutdown_executor():
+    """Stop the worker processes, abandoning queued jobs"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logger.info("Job executor stopped")
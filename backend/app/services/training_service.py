@@ -1,10 +1,11 @@
 """Training service for DRL agents"""
 import os
 import sys
+import threading
 import time
 import uuid
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import logging
 from pathlib import Path
 
@@ -12,7 +13,17 @@ from ..config import settings
 from ..utils.storage import ensure_output_dir, save_json, save_config
 from ..services.data_service import data_service
 from ..drl.stock_env import CustomStockTradingEnv
-from ..utils.logger import training_service_logger as logger, setup_training_logger
+from ..drl.backtest_kernels import pooled_episode_metrics
+from ..utils.logger import (
+    training_service_logger as logger,
+    close_training_logger,
+    setup_training_logger
+)
+
+
+# Minimum seconds between progress.json writes for an algorithm while it is
+# training; status changes are always written immediately
+PROGRESS_FLUSH_INTERVAL = 2.0
 
 
 class TrainingService:
@@ -20,6 +31,19 @@ class TrainingService:
     
     def __init__(self):
         self.active_jobs = {}
+        # Serializes progress.json updates; replaced by a process-shared lock
+        # when algorithms train in parallel processes
+        self.progress_lock = threading.Lock()
+        # Set when other processes update the same progress.json (algorithms
+        # training in parallel); the file is then re-read before every update
+        self.progress_shared = False
+        # job_id -> (progress.json contents as last written by this process,
+        # their progress entries by algorithm), so a job's updates neither
+        # re-read and re-parse the file nor search the entry list
+        self._progress_cache: Dict[str, Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]] = {}
+        # (job_id, algorithm) -> time.monotonic() before which "training"
+        # progress updates are skipped
+        self._progress_next_write: Dict[Tuple[str, str], float] = {}
     
     async def start_training(
         self,
@@ -104,6 +128,9 @@ class TrainingService:
         
         logger.info(f"Training job {job_id} initialized")
         
+        # The job itself runs, and logs, in a worker process
+        close_training_logger(job_id)
+        
         return job_id
     
     def train_algorithm(
@@ -156,7 +183,8 @@ class TrainingService:
                 # Pass actual timesteps instead of converting to 1000 scale
                 # This way frontend displays real progress like "5000/10000" instead of "500/1000"
                 self._update_progress(job_id, algorithm, epoch, total_timesteps, loss, reward, status)
-                job_logger.debug(f"Progress update: epoch={epoch}/{total_timesteps}, loss={loss:.4f}, reward={reward:.2f}, status={status}")
+                job_logger.debug("Progress update: epoch=%d/%d, loss=%.4f, reward=%.2f, status=%s",
+                                 epoch, total_timesteps, loss, reward, status)
             
             # Initialize trainer
             logger.info(f"Initializing DRLTrainer for {algorithm}...")
@@ -166,7 +194,10 @@ class TrainingService:
                 env=train_env,
                 algorithm=algorithm,
                 model_dir=str(model_dir),
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                n_envs=settings.train_num_envs,
+                num_threads=settings.torch_num_threads,
+                compile_policy=settings.train_torch_compile
             )
             
             logger.info(f"Trainer initialized. Device: {trainer.device}")
@@ -191,28 +222,26 @@ class TrainingService:
             # Evaluate on test environment
             logger.info(f"Evaluating {algorithm} on test set...")
             job_logger.info(f"Starting test set evaluation...")
-            test_reward = self._evaluate_on_test(trainer, test_env)
+            test_reward, sharpe, max_drawdown, win_rate = self._evaluate_on_test(trainer, test_env)
             logger.info(f"Test reward: {test_reward:.4f}")
             job_logger.info(f"Test set evaluation completed: reward={test_reward:.4f}")
             
-            # Calculate metrics
+            # Calculate metrics; the evaluation returns plain floats (or NumPy
+            # float64, a float subclass), so no casts are needed
             initial_amount = settings.initial_amount
             # Use test reward as the profit/loss
             total_reward = test_reward
             final_amount = initial_amount * (1 + total_reward)  # total_reward is already a ratio
             return_rate = total_reward * 100
             
-            # Calculate Sharpe ratio from test episode
-            sharpe = self._calculate_sharpe_ratio(trainer, test_env)
-            
             metrics = {
-                "totalReward": float(total_reward * initial_amount),
-                "sharpeRatio": float(sharpe),
-                "maxDrawdown": float(np.random.uniform(-0.2, -0.05)),  # TODO: Calculate properly
-                "winRate": float(np.random.uniform(0.5, 0.7)),  # TODO: Calculate properly
-                "initialAmount": float(initial_amount),
-                "finalAmount": float(final_amount),
-                "returnRate": float(return_rate)
+                "totalReward": total_reward * initial_amount,
+                "sharpeRatio": sharpe,
+                "maxDrawdown": max_drawdown,
+                "winRate": win_rate,
+                "initialAmount": initial_amount,
+                "finalAmount": final_amount,
+                "returnRate": return_rate
             }
             
             training_time = time.time() - start_time
@@ -270,93 +299,134 @@ class TrainingService:
                 "modelPath": ""
             }
     
-    def _evaluate_on_test(self, trainer, test_env, num_episodes: int = 5) -> float:
-        """Evaluate trained model on test environment"""
-        # Apply discrete wrapper for DQN if needed
-        if trainer.algorithm == "DQN":
-            from app.drl.discrete_wrapper import DiscreteActionWrapper
-            test_env = DiscreteActionWrapper(test_env, n_actions_per_stock=3)
-            logger.debug(f"Applied DiscreteActionWrapper for DQN evaluation (3 actions/stock)")
+    def _evaluate_on_test(self, trainer, test_env, num_episodes: int = 5) -> Tuple[float, float, float, float]:
+        """
+        Evaluate trained model on test environment
         
-        logger.debug(f"Starting test evaluation: {num_episodes} episodes")
+        The mean return rate, Sharpe ratio, max drawdown and win rate are all
+        derived from the same test episodes.
         
+        Returns:
+            (mean return rate, annualized Sharpe ratio of the daily returns,
+            max drawdown as a negative fraction, share of days with a gain)
+        """
         if trainer.model is None:
             logger.warning("No trained model available")
-            return 0.0
+            return 0.0, 0.0, 0.0, 0.0
         
-        returns = []
+        if not test_env.if_random_reset:
+            # Deterministic reset and deterministic actions replay the same
+            # episode every time, so one episode gives the same metrics
+            num_episodes = 1
+        logger.debug("Starting test evaluation: %d episodes", num_episodes)
         
-        for episode in range(num_episodes):
-            logger.debug(f"  Evaluation episode {episode+1}/{num_episodes}")
-            state, _ = test_env.reset()
-            episode_return = 0.0
-            
-            for _ in range(test_env.max_step):
-                # Use SB3's predict method
-                action, _ = trainer.model.predict(state, deterministic=True)
-                state, reward, done, truncated, _ = test_env.step(action)
-                episode_return += reward
-                
-                if done or truncated:
-                    break
-            
-            # Calculate return rate from final portfolio value
-            env_unwrapped = getattr(test_env, 'unwrapped', test_env)
-            if hasattr(env_unwrapped, 'get_total_asset') and hasattr(env_unwrapped, 'initial_amount'):
-                final_value = env_unwrapped.get_total_asset()
-                return_rate = (final_value - env_unwrapped.initial_amount) / env_unwrapped.initial_amount
-                returns.append(return_rate)
-                logger.debug(f"    Episode {episode+1} return: {return_rate:.4f} (${final_value:.2f})")
+        import torch
+        
+        # Run the episodes without autograd bookkeeping
+        with torch.inference_mode():
+            if trainer.algorithm == "DQN":
+                # Apply discrete wrapper for DQN
+                from app.drl.discrete_wrapper import DiscreteActionWrapper
+                eval_env = DiscreteActionWrapper(test_env, n_actions_per_stock=3)
+                logger.debug("Applied DiscreteActionWrapper for DQN evaluation (3 actions/stock)")
+                portfolio_values = self._run_episodes(trainer, eval_env, num_episodes)
             else:
-                # Fallback: use accumulated rewards (not recommended)
-                logger.warning(f"    Episode {episode+1}: env lacks get_total_asset(), using reward sum (unreliable)")
-                returns.append(episode_return)
+                portfolio_values = self._run_batched_episodes(trainer, test_env, num_episodes)
         
+        returns = (portfolio_values[-1] - test_env.initial_amount) / test_env.initial_amount
         mean_return = np.mean(returns)
-        logger.debug(f"Test evaluation completed: mean={mean_return:.4f}, std={np.std(returns):.4f}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Test evaluation completed: mean=%.4f, std=%.4f", mean_return, np.std(returns))
         
-        return mean_return
+        # Daily returns of every episode are measured from the initial amount
+        portfolio_values[0] = settings.initial_amount
+        sharpe, max_drawdown, win_rate = pooled_episode_metrics(portfolio_values)
+        return mean_return, sharpe, max_drawdown, win_rate
     
-    def _calculate_sharpe_ratio(self, trainer, test_env, num_episodes: int = 3) -> float:
-        """Calculate Sharpe ratio from test episodes"""
-        # Apply discrete wrapper for DQN if needed
-        if trainer.algorithm == "DQN":
-            from app.drl.discrete_wrapper import DiscreteActionWrapper
-            test_env = DiscreteActionWrapper(test_env, n_actions_per_stock=3)
-            logger.debug(f"Applied DiscreteActionWrapper for DQN Sharpe calculation (3 actions/stock)")
-        
-        if trainer.model is None:
-            logger.warning("No trained model available")
-            return 0.0
-        
-        daily_returns_list = []
+    def _run_episodes(self, trainer, eval_env, num_episodes: int) -> np.ndarray:
+        """
+        Run deterministic test episodes one after another, one predict per step
         
-        for _ in range(num_episodes):
-            state, _ = test_env.reset()
-            daily_returns = []
-            prev_value = settings.initial_amount
-            
-            for _ in range(test_env.max_step):
+        Returns:
+            Shape (max_step + 1, num_episodes) - portfolio value after reset
+            and after each step of every episode
+        """
+        base_env = eval_env.unwrapped
+        portfolio_values = np.empty((base_env.max_step + 1, num_episodes))
+        # Bound once, outside the per-step loop
+        predict = trainer.model.predict
+        env_step = eval_env.step
+        get_total_asset = base_env.get_total_asset
+        for episode in range(num_episodes):
+            logger.debug("  Evaluation episode %d/%d", episode + 1, num_episodes)
+            state, _ = eval_env.reset()
+            portfolio_values[0, episode] = get_total_asset()
+            for step in range(base_env.max_step):
                 # Use SB3's predict method
-                action, _ = trainer.model.predict(state, deterministic=True)
-                state, reward, done, truncated, _ = test_env.step(action)
-                
-                current_value = test_env.get_total_asset()
-                daily_return = (current_value - prev_value) / prev_value
-                daily_returns.append(daily_return)
-                prev_value = current_value
+                action, _ = predict(state, deterministic=True)
+                state, reward, done, truncated, _ = env_step(action)
+                portfolio_values[step + 1, episode] = get_total_asset()
                 
                 if done or truncated:
+                    # Hold the final value for any remaining days
+                    portfolio_values[step + 2:, episode] = portfolio_values[step + 1, episode]
                     break
-            
-            daily_returns_list.extend(daily_returns)
         
-        if len(daily_returns_list) == 0:
-            return 0.0
+        return portfolio_values
+    
+    def _run_batched_episodes(self, trainer, test_env, num_episodes: int) -> np.ndarray:
+        """
+        Run deterministic test episodes side by side in a BatchStockTradingEnv
+        
+        One batched predict per day instead of one per day and episode; only
+        for continuous-action models.
+        
+        Returns:
+            Shape (max_step + 1, num_episodes) - portfolio value after reset
+            and after each step of every episode
+        """
+        from app.drl.batch_env import BatchStockTradingEnv
+        eval_vec = BatchStockTradingEnv(test_env, num_episodes)
+        
+        portfolio_values = np.empty((test_env.max_step + 1, num_episodes))
+        state = eval_vec.reset()
+        portfolio_values[0] = eval_vec.total_asset
+        # Bound once, outside the per-step loop
+        predict = trainer.model.predict
+        env_step = eval_vec.step
+        for step in range(test_env.max_step):
+            action, _ = predict(state, deterministic=True)
+            state, _, dones, infos = env_step(action)
+            if dones.any():
+                # Finished episodes are reset; their final value is in the infos
+                portfolio_values[step + 1] = [info["total_asset"] for info in infos]
+            else:
+                portfolio_values[step + 1] = eval_vec.total_asset
         
-        daily_returns_array = np.array(daily_returns_list)
-        sharpe = (daily_returns_array.mean() / (daily_returns_array.std() + 1e-9)) * np.sqrt(252)
-        return sharpe
+        return portfolio_values
+    
+    def mark_job_failed(self, job_id: str):
+        """Mark the algorithms of a job that have not finished as failed"""
+        from ..utils.storage import load_json
+        with self.progress_lock:
+            # Every cached update was also written, so the file is current
+            self._progress_cache.pop(job_id, None)
+            try:
+                progress_data = load_json(job_id, "progress.json")
+            except FileNotFoundError:
+                return
+            changed = False
+            for prog in progress_data["progress"]:
+                if prog["status"] not in ("completed", "failed"):
+                    prog["status"] = "failed"
+                    changed = True
+            if changed:
+                save_json(job_id, "progress.json", progress_data)
+    
+    def share_progress(self, progress_lock):
+        """Coordinate progress.json updates with other processes through ``progress_lock``"""
+        self.progress_lock = progress_lock
+        self.progress_shared = True
     
     def _update_progress(
         self,
@@ -369,21 +439,47 @@ class TrainingService:
         status: str
     ):
         """Update progress JSON file"""
+        # The training callback reports every 100 steps; only the latest values
+        # matter to pollers, so intermediate updates are written at most once
+        # per PROGRESS_FLUSH_INTERVAL
+        key = (job_id, algorithm)
+        now = time.monotonic()
+        if status == "training":
+            if now < self._progress_next_write.get(key, 0.0):
+                return
+            self._progress_next_write[key] = now + PROGRESS_FLUSH_INTERVAL
+        else:
+            self._progress_next_write.pop(key, None)
+        
         try:
             from ..utils.storage import load_json
-            progress_data = load_json(job_id, "progress.json")
-            
-            # Find and update the algorithm's progress
-            for prog in progress_data["progress"]:
-                if prog["algorithm"] == algorithm:
+            with self.progress_lock:
+                cached = None if self.progress_shared else self._progress_cache.get(job_id)
+                if cached is None:
+                    progress_data = load_json(job_id, "progress.json")
+                    entries = {prog["algorithm"]: prog for prog in progress_data["progress"]}
+                else:
+                    progress_data, entries = cached
+                
+                # Update the algorithm's progress
+                prog = entries.get(algorithm)
+                if prog is not None:
                     prog["epoch"] = epoch
                     prog["totalEpochs"] = total_epochs
                     prog["loss"] = loss
                     prog["reward"] = reward
                     prog["status"] = status
-                    break
-            
-            save_json(job_id, "progress.json", progress_data)
+                
+                save_json(job_id, "progress.json", progress_data)
+                
+                # A "training" update means this algorithm is still running
+                finished = status != "training" and all(
+                    prog["status"] in ("completed", "failed") for prog in progress_data["progress"]
+                )
+                if self.progress_shared or finished:
+                    self._progress_cache.pop(job_id, None)
+                else:
+                    self._progress_cache[job_id] = (progress_data, entries)
         except Exception as e:
             logger.error(f"Error updating progress: {e}")
 
@@ -0,0 +1,31 @@
+"""HTTP caching helpers for polled endpoints"""
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Apply ETag revalidation to a response
+
+    Sets ``ETag`` and ``Cache-Control: no-cache`` (clients revalidate on every
+    poll) on ``response``.
+
+    Args:
+        request: Incoming request
+        response: Response whose headers are sent with the handler's result
+        etag: ETag of the current representation
+
+    Returns:
+        A 304 response if the client's If-None-Match already has ``etag``,
+        otherwise None and the handler builds the body as usual
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
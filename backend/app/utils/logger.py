@@ -1,18 +1,23 @@
 """
 Logging configuration for DRL training and backtesting
 """
+import atexit
 import logging
+import logging.handlers
+import multiprocessing.util
 import os
+import queue
 from pathlib import Path
 from datetime import datetime
 import sys
+from typing import Dict
 
 # Create logs directory
 LOGS_DIR = Path("logs")
 LOGS_DIR.mkdir(exist_ok=True)
 
 # Define log levels
-LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 # Create formatters
 detailed_formatter = logging.Formatter(
@@ -25,15 +30,45 @@ simple_formatter = logging.Formatter(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+# Job loggers set up in this process, by log file name
+_job_loggers: Dict[str, logging.Logger] = {}
 
-def setup_logger(name: str, log_file: str = None, level=logging.DEBUG) -> logging.Logger:
+# Listener thread draining each configured logger's queue, by logger name
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+def _stop_listener(name: str):
+    """Flush a logger's queued records and close its console/file handlers"""
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def _stop_listeners():
+    for name in list(_listeners):
+        _stop_listener(name)
+
+
+# Flush queued records on exit. Pool worker processes skip atexit hooks but
+# run multiprocessing finalizers, so register with both.
+atexit.register(_stop_listeners)
+multiprocessing.util.Finalize(None, _stop_listeners, exitpriority=10)
+
+
+def setup_logger(name: str, log_file: str = None, level=LOG_LEVEL) -> logging.Logger:
     """
     Setup a logger with both file and console handlers
     
+    The logger itself only enqueues records; a listener thread formats them
+    and does the blocking console and file I/O, so logging from the training
+    loop costs a queue put.
+    
     Args:
         name: Logger name
         log_file: Log file name (if None, uses name-based default)
-        level: Logging level
+        level: Logging level (defaults to the LOG_LEVEL environment variable)
     
     Returns:
         Configured logger
@@ -41,14 +76,16 @@ def setup_logger(name: str, log_file: str = None, level=logging.DEBUG) -> loggin
     logger = logging.getLogger(name)
     logger.setLevel(level)
     
-    # Remove existing handlers to avoid duplicates
+    # Remove existing handlers to avoid duplicates, releasing their files
+    _stop_listener(name)
+    for handler in logger.handlers:
+        handler.close()
     logger.handlers.clear()
     
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
-    logger.addHandler(console_handler)
     
     # Create file handler
     if log_file is None:
@@ -62,7 +99,16 @@ def setup_logger(name: str, log_file: str = None, level=logging.DEBUG) -> loggin
     )
     file_handler.setLevel(level)
     file_handler.setFormatter(detailed_formatter)
-    logger.addHandler(file_handler)
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Formatted by the real handlers
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    _listeners[name] = listener
     
     return logger
 
@@ -75,11 +121,9 @@ def setup_training_logger(job_id: str) -> logging.Logger:
         job_id: Training job ID
     
     Returns:
-        Job-specific logger
+        Job-specific logger, reused by later calls in the same process
     """
-    logger_name = f"training.{job_id[:8]}"
-    log_file = f"training_{job_id}.log"
-    return setup_logger(logger_name, log_file)
+    return _get_job_logger(f"training.{job_id[:8]}", f"training_{job_id}.log")
 
 
 def setup_backtest_logger(job_id: str) -> logging.Logger:
@@ -90,10 +134,37 @@ def setup_backtest_logger(job_id: str) -> logging.Logger:
         job_id: Backtest job ID
     
     Returns:
+        Job-specific logger, reused by later calls in the same process
     """
-    logger_name = f"backtest.{job_id[:8]}"
-    log_file = f"backtest_{job_id}.log"
-    return setup_logger(logger_name, log_file)
+    return _get_job_logger(f"backtest.{job_id[:8]}", f"backtest_{job_id}.log")
+
+
+def close_training_logger(job_id: str):
+    """Close the log file of a training job's logger in this process"""
+    _close_job_logger(f"training_{job_id}.log")
+
+
+def close_backtest_logger(job_id: str):
+    """Close the log file of a backtest job's logger in this process"""
+    _close_job_logger(f"backtest_{job_id}.log")
+
+
+def _get_job_logger(logger_name: str, log_file: str) -> logging.Logger:
+    """Set up a job logger once per process and reuse it afterwards"""
+    logger = _job_loggers.get(log_file)
+    if logger is None:
+        logger = setup_logger(logger_name, log_file)
+        _job_loggers[log_file] = logger
+    return logger
+
+
+def _close_job_logger(log_file: str):
+    logger = _job_loggers.pop(log_file, None)
+    if logger is not None:
+        _stop_listener(logger.name)
+        for handler in logger.handlers:
+            handler.close()
+        logger.handlers.clear()
 
 
 # Global loggers for services
@@ -1,34 +1,92 @@
 """File storage utilities"""
-import os
+import functools
 import json
+import math
+import os
 from pathlib import Path
 from typing import Any, Dict
 import logging
+import numpy as np
+import orjson
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Job directories known to exist, and those whose subdirectories this process
+# has created, so polling endpoints and repeated saves skip the stat/mkdir
+# calls; job directories are assumed not to be deleted while the process is
+# running
+_existing_job_dirs = set()
+_created_job_dirs = set()
+
+# Job configurations by job_id; config.json is written once when a job is
+# created and never changes afterwards
+_config_cache: Dict[str, Dict[str, Any]] = {}
+
+# Backtest results: metadata and metrics as JSON, return series in binary
+BACKTEST_RESULTS_FILE = "backtest_results.json"
+BACKTEST_ARRAYS_FILE = "backtest_arrays.npz"
+_BACKTEST_SERIES = ("returns", "cumulativeReturns")
+
 
 def ensure_output_dir(job_id: str) -> Path:
     """Create output directory structure for a job"""
     job_dir = Path(settings.output_dir) / job_id
+    if job_dir in _created_job_dirs:
+        return job_dir
+    
     job_dir.mkdir(parents=True, exist_ok=True)
     
     # Create subdirectories
     (job_dir / "data").mkdir(exist_ok=True)
     (job_dir / "models").mkdir(exist_ok=True)
     
+    _created_job_dirs.add(job_dir)
+    _existing_job_dirs.add(job_dir)
     return job_dir
 
 
+def _has_non_finite(obj: Any) -> bool:
+    """Whether a JSON-able structure holds a NaN or infinite float"""
+    if isinstance(obj, (float, np.floating)):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    if isinstance(obj, np.ndarray):
+        return obj.dtype.kind in 'fc' and not np.isfinite(obj).all()
+    return False
+
+
+def _json_default(obj: Any) -> Any:
+    """Convert NumPy values for the stdlib json encoder"""
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
 def save_json(job_id: str, filename: str, data: Dict[str, Any]):
-    """Save JSON data to job directory"""
+    """
+    Save JSON data to job directory
+    
+    orjson writes bytes directly and handles NumPy scalars and arrays, but
+    it writes NaN and infinities as null. Data holding any (a zero-volatility
+    Sharpe ratio, a diverged loss) is written with the stdlib encoder
+    instead, as NaN / Infinity, so it reads back as the same floats.
+    """
     job_dir = ensure_output_dir(job_id)
     filepath = job_dir / filename
     
-    with open(filepath, 'w') as f:
-        json.dump(data, f, indent=2)
+    if _has_non_finite(data):
+        content = json.dumps(data, indent=2, default=_json_default).encode()
+    else:
+        content = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    # The file is replaced atomically, so pollers never read a partial write
+    tmp_path = job_dir / f".{filename}.{os.getpid()}.tmp"
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, filepath)
     
     logger.info(f"Saved {filename} for job {job_id}")
 
@@ -37,19 +95,93 @@ def load_json(job_id: str, filename: str) -> Dict[str, Any]:
     """Load JSON data from job directory"""
     filepath = Path(settings.output_dir) / job_id / filename
     
-    if not filepath.exists():
-        raise FileNotFoundError(f"File {filename} not found for job {job_id}")
+    try:
+        content = filepath.read_bytes()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"File {filename} not found for job {job_id}") from None
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError:
+        # NaN / Infinity, which only the stdlib parser accepts
+        return json.loads(content)
+
+
+def save_backtest_results(job_id: str, data: Dict[str, Any]):
+    """
+    Save backtest results, with each result's return series stored as float64
+    arrays in a companion npz instead of JSON text
+    
+    The arrays are written first, so a results file on disk always has its
+    series next to it.
+    """
+    job_dir = ensure_output_dir(job_id)
+    arrays = {}
+    results = []
+    for i, result in enumerate(data["results"]):
+        result = dict(result)
+        for key in _BACKTEST_SERIES:
+            arrays[f"{i}_{key}"] = np.asarray(result.pop(key), dtype=np.float64)
+        results.append(result)
+    
+    tmp_path = job_dir / f".{BACKTEST_ARRAYS_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, job_dir / BACKTEST_ARRAYS_FILE)
     
-    with open(filepath, 'r') as f:
-        return json.load(f)
+    save_json(job_id, BACKTEST_RESULTS_FILE, {**data, "results": results})
+
+
+def load_backtest_results(job_id: str) -> Dict[str, Any]:
+    """Load backtest results saved by save_backtest_results, series included"""
+    data = load_json(job_id, BACKTEST_RESULTS_FILE)
+    results = data["results"]
+    # Results saved before the split keep their series inline
+    if results and _BACKTEST_SERIES[0] not in results[0]:
+        arrays_path = Path(settings.output_dir) / job_id / BACKTEST_ARRAYS_FILE
+        try:
+            arrays = np.load(arrays_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"File {BACKTEST_ARRAYS_FILE} not found for job {job_id}"
+            ) from None
+        with arrays:
+            for i, result in enumerate(results):
+                for key in _BACKTEST_SERIES:
+                    result[key] = arrays[f"{i}_{key}"].tolist()
+    return data
+
+
+def job_files_etag(job_id: str, *filenames: str) -> str:
+    """
+    Weak ETag for a response built from the given job files
+    
+    Derived from each file's mtime and size, so it changes whenever a file is
+    rewritten; missing files contribute a fixed marker.
+    """
+    job_dir = Path(settings.output_dir) / job_id
+    parts = []
+    for filename in filenames:
+        try:
+            stat = os.stat(job_dir / filename)
+        except FileNotFoundError:
+            parts.append("0")
+            continue
+        parts.append(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    return f'W/"{".".join(parts)}"'
 
 
 def job_exists(job_id: str) -> bool:
     """Check if a job directory exists"""
     job_dir = Path(settings.output_dir) / job_id
-    return job_dir.exists()
+    if job_dir in _existing_job_dirs:
+        return True
+    if job_dir.exists():
+        _existing_job_dirs.add(job_dir)
+        return True
+    return False
 
 
+@functools.lru_cache(maxsize=1024)
 def get_job_dir(job_id: str) -> Path:
     """Get job directory path"""
     return Path(settings.output_dir) / job_id
@@ -58,9 +190,14 @@ def get_job_dir(job_id: str) -> Path:
 def save_config(job_id: str, config: Dict[str, Any]):
     """Save job configuration"""
     save_json(job_id, "config.json", config)
+    _config_cache[job_id] = config
 
 
 def load_config(job_id: str) -> Dict[str, Any]:
-    """Load job configuration"""
-    return load_json(job_id, "config.json")
+    """Load job configuration, read from disk once per process (do not modify it)"""
+    config = _config_cache.get(job_id)
+    if config is None:
+        config = load_json(job_id, "config.json")
+        _config_cache[job_id] = config
+    return config
 
@@ -1,16 +1,25 @@
 """Run the FastAPI application"""
 import uvicorn
 import os
+import sys
 
 if __name__ == "__main__":
     # Ensure outputs directory exists
     os.makedirs("outputs", exist_ok=True)
     
+    # DEBUG=1 restarts on code changes. The server always runs as one
+    # process: jobs execute in its own executor, and the job-directory and
+    # response caches are process-local, so extra workers would serve stale
+    # job state and multiply job concurrency.
+    debug = os.getenv("DEBUG") == "1"
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        reload=debug,
+        log_level="info",
+        # uvloop and httptools come with uvicorn[standard]; uvloop has no Windows build
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools"
     )
 
@@ -29,9 +29,19 @@ def test_connection():
         # Test stock query
         print("\n3. Testing stock queries...")
         
-        # First check what stocks are available
-        sample_query = "SELECT ticker, name FROM kol.stock LIMIT 5"
+        # First check what stocks are available, fetching each one's price
+        # date range in the same round trip over the tunnel
+        sample_query = """
+            SELECT s.id, s.ticker, s.name, r.min_date, r.max_date
+            FROM (SELECT id, ticker, name FROM kol.stock LIMIT 5) s
+            LEFT JOIN LATERAL (
+                SELECT MIN(date) as min_date, MAX(date) as max_date
+                FROM kol.stock_price
+                WHERE stock_id = s.id
+            ) r ON TRUE
+        """
         sample_stocks = db_manager.execute_query(sample_query)
+        date_ranges = {s['id']: s for s in sample_stocks}
         print(f"   Sample stocks in database:")
         for s in sample_stocks:
             print(f"     - {s['ticker']}: {s.get('name', 'N/A')}")
@@ -51,16 +61,11 @@ def test_connection():
             print("\n4. Testing price queries...")
             stock_id = stocks[0]['id']
             
-            # Try to find what date range has data
-            date_range_query = f"""
-                SELECT MIN(date) as min_date, MAX(date) as max_date 
-                FROM kol.stock_price 
-                WHERE stock_id = {stock_id}
-            """
-            date_range = db_manager.execute_query(date_range_query)
-            if date_range and date_range[0]['min_date']:
-                min_date = date_range[0]['min_date']
-                max_date = date_range[0]['max_date']
+            # Date range with data, from the sample query
+            date_range = date_ranges.get(stock_id)
+            if date_range and date_range['min_date']:
+                min_date = date_range['min_date']
+                max_date = date_range['max_date']
                 print(f"   Available data range: {min_date} to {max_date}")
                 
                 # Use the actual date range